@@ -0,0 +1,114 @@
+"""
+Mide el arranque en frío de main:app: tiempo de import por módulo y tiempo hasta estar listo
+
+Uso:
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --runs 5 --top 25 --budget 2.5   # sale con código 1 si se supera
+
+Cada medición usa un proceso nuevo, como un arranque de instancia en Cloud Run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Se ejecuta en el proceso hijo: import de main, lifespan y primera respuesta de /health
+_READY_PROBE = r"""
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+import httpx
+
+async def probe():
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold-start") as client:
+            response = await client.get("/health")
+        first_response = time.perf_counter()
+    return ready, first_response, response.status_code
+
+ready, first_response, status = asyncio.run(probe())
+print(json.dumps({
+    "import_s": imported - started,
+    "startup_s": ready - imported,
+    "ready_s": ready - started,
+    "first_response_s": first_response - started,
+    "status": status,
+}))
+"""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío de main:app")
+    parser.add_argument("--runs", type=int, default=3, help="Procesos nuevos a medir")
+    parser.add_argument("--top", type=int, default=20, help="Módulos más lentos a mostrar")
+    parser.add_argument("--budget", type=float, default=None, help="Máximo de segundos hasta estar listo")
+    return parser.parse_args()
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    # El arranque no llama a ningún servicio: bastan valores de relleno si no hay .env
+    env.setdefault("OPENAI_API_KEY", "sk-cold-start")
+    env.setdefault("SUPABASE_URL", "http://localhost")
+    env.setdefault("SUPABASE_KEY", "cold-start")
+    # La precarga en segundo plano no debe competir con la medición
+    env.setdefault("WARMUP", "0")
+    return env
+
+
+def import_times(top: int):
+    """Módulos con más tiempo de import acumulado según ``python -X importtime``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, env=child_env(), check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+
+    print(f"{'acumulado':>10} {'propio':>9}  módulo")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>8.0f}ms {self_us / 1000:>7.0f}ms  {name}")
+
+
+def ready_times(runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", _READY_PROBE],
+            capture_output=True, text=True, env=child_env(), check=True
+        )
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    summary = {
+        key: statistics.median(sample[key] for sample in samples)
+        for key in ("import_s", "startup_s", "ready_s", "first_response_s")
+    }
+    print(
+        f"\n⏱️ Mediana de {runs} arranques: import {summary['import_s']:.2f}s, "
+        f"lifespan {summary['startup_s']:.2f}s, listo {summary['ready_s']:.2f}s, "
+        f"primera respuesta {summary['first_response_s']:.2f}s"
+    )
+    return summary
+
+
+def main(args: argparse.Namespace) -> int:
+    import_times(args.top)
+    summary = ready_times(args.runs)
+    if args.budget is not None and summary["ready_s"] > args.budget:
+        print(f"❌ Arranque por encima del presupuesto: {summary['ready_s']:.2f}s > {args.budget:.2f}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
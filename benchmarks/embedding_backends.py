@@ -0,0 +1,101 @@
+"""
+Compara la inferencia de embeddings locales en CPU: PyTorch frente a ONNX y ONNX int8
+
+Uso:
+    pip install "sentence-transformers[onnx]"
+    python -m benchmarks.embedding_backends --model all-MiniLM-L6-v2 --texts 512
+    python -m benchmarks.embedding_backends --save-dir models/minilm-int8   # conserva el modelo int8
+
+Para servir el modelo cuantizado guardado:
+    SENTENCE_TRANSFORMERS_BACKEND=onnx
+    SENTENCE_TRANSFORMERS_ONNX_FILE=onnx/model_qint8_avx2.onnx
+y usar ``--save-dir`` como nombre del modelo.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from utils.tools.vector_utils import normalize_rows
+
+SAMPLE_TEXTS = [
+    "Los españoles son iguales ante la ley, sin que pueda prevalecer discriminación alguna.",
+    "Toda persona tiene derecho a la libertad y a la seguridad.",
+    "La detención preventiva no podrá durar más del tiempo estrictamente necesario.",
+    "Se garantiza el derecho al honor, a la intimidad personal y familiar y a la propia imagen.",
+    "Las Fuerzas y Cuerpos de Seguridad tendrán como misión proteger el libre ejercicio de los derechos.",
+    "El domicilio es inviolable. Ninguna entrada o registro podrá hacerse sin consentimiento del titular.",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark de backends de sentence-transformers en CPU")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--texts", type=int, default=512, help="Textos a codificar por ronda")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--quantization", default="avx2", help="avx2, avx512, avx512_vnni o arm64")
+    parser.add_argument("--save-dir", default=None, help="Directorio donde conservar el modelo ONNX int8")
+    return parser.parse_args()
+
+
+def load(label: str, factory):
+    started = time.perf_counter()
+    model = factory()
+    print(f"⏳ {label}: cargado en {time.perf_counter() - started:.2f}s")
+    return model
+
+
+def measure(label: str, model, texts, batch_size: int, rounds: int) -> np.ndarray:
+    model.encode(texts[:batch_size], batch_size=batch_size)  # calentamiento
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    print(f"📊 {label}: {len(texts) / median:,.0f} textos/s (mediana {median * 1000:.0f} ms, mejor {min(timings) * 1000:.0f} ms)")
+    return normalize_rows(vectors)
+
+
+def agreement(label: str, reference: np.ndarray, vectors: np.ndarray):
+    cosines = np.sum(reference * vectors, axis=1)
+    # ¿Se conserva el vecino más cercano de cada texto?
+    same_neighbour = np.mean(
+        np.argsort(-(reference @ reference.T), axis=1)[:, 1] == np.argsort(-(vectors @ vectors.T), axis=1)[:, 1]
+    )
+    print(f"🎯 {label} vs torch: coseno medio {cosines.mean():.4f} (mín {cosines.min():.4f}), vecino más cercano igual {same_neighbour:.1%}")
+
+
+def main(args: argparse.Namespace):
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    # Textos variados y con longitudes distintas
+    texts = [
+        " ".join(SAMPLE_TEXTS[(i + j) % len(SAMPLE_TEXTS)] for j in range(1 + i % 4)) + f" ({i})"
+        for i in range(args.texts)
+    ]
+
+    torch_model = load("torch", lambda: SentenceTransformer(args.model))
+    reference = measure("torch", torch_model, texts, args.batch_size, args.rounds)
+
+    onnx_model = load("onnx", lambda: SentenceTransformer(args.model, backend="onnx"))
+    agreement("onnx", reference, measure("onnx", onnx_model, texts, args.batch_size, args.rounds))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        save_dir = args.save_dir or tmp
+        onnx_model.save(save_dir)
+        export_dynamic_quantized_onnx_model(onnx_model, args.quantization, save_dir)
+        onnx_file = f"onnx/model_qint8_{args.quantization}.onnx"
+        int8_model = load("onnx int8", lambda: SentenceTransformer(
+            save_dir, backend="onnx", model_kwargs={"file_name": onnx_file}
+        ))
+        agreement("onnx int8", reference, measure("onnx int8", int8_model, texts, args.batch_size, args.rounds))
+        if args.save_dir:
+            print(f"💾 Modelo int8 guardado en {save_dir} ({onnx_file})")
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,105 @@
+"""
+Recall, memoria y latencia del índice local según precisión, dimensiones y reordenación
+
+Uso:
+    python -m benchmarks.quantization_recall                       # vectores de law_items (Supabase)
+    python -m benchmarks.quantization_recall --synthetic 50000     # sin red: vectores aleatorios correlados
+    python -m benchmarks.quantization_recall --dimensions 3072,1024,256 --multipliers 1,4,10
+
+La referencia es la búsqueda exacta en float32 con todas las dimensiones. Las
+consultas son vectores del propio corpus que se retiran del índice.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from utils.services.local_vector_index import LocalVectorIndex
+from utils.tools.quantization import PRECISIONS
+from utils.tools.vector_utils import normalize_rows, top_k_similar
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Recall del índice local cuantizado frente a float32")
+    parser.add_argument("--synthetic", type=int, default=0, help="Vectores sintéticos en vez de law_items")
+    parser.add_argument("--synthetic-dim", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=200, help="Vectores del corpus usados como consultas")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--precisions", default=",".join(PRECISIONS))
+    parser.add_argument("--dimensions", default="0", help="Recortes Matryoshka separados por comas (0 = completo)")
+    parser.add_argument("--multipliers", default="1,4", help="Candidatos reordenados por resultado")
+    return parser.parse_args()
+
+
+def csv_ints(value: str):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+async def load_corpus(args: argparse.Namespace) -> np.ndarray:
+    if args.synthetic:
+        # Pocas direcciones latentes + ruido: se parece más a embeddings reales que el ruido puro
+        rng = np.random.default_rng(0)
+        latent = rng.standard_normal((64, args.synthetic_dim)).astype(np.float32)
+        mixing = rng.standard_normal((args.synthetic, 64)).astype(np.float32)
+        noise = 0.3 * rng.standard_normal((args.synthetic, args.synthetic_dim)).astype(np.float32)
+        return normalize_rows(mixing @ latent + noise, copy=False)
+
+    index = LocalVectorIndex(precision="float32")
+    try:
+        await index.load()
+    finally:
+        await index.supabase.aclose()
+    if not index.is_ready:
+        raise SystemExit("❌ No hay embeddings en law_items")
+    return index.matrix
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, precision: str, dimensions: int, multiplier: int, rescore_dir: str) -> dict:
+    index = LocalVectorIndex(
+        supabase=object(),  # no se descarga nada: el índice se construye en memoria
+        precision=precision,
+        dimensions=dimensions or None,
+        rescore_multiplier=multiplier,
+        rescore_path=f"{rescore_dir}/{precision}-{dimensions}.npy"
+    )
+    ids = list(range(corpus.shape[0]))
+    index.build(ids, [{"id": i} for i in ids], corpus.copy())
+
+    hits, timings = 0, []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        results = index.search(query, k)
+        timings.append(time.perf_counter() - started)
+        hits += len({doc["id"] for doc in results} & set(expected.tolist()))
+    return {
+        "recall": hits / truth.size,
+        "memory_mb": index.memory_bytes / 1e6,
+        "ms": statistics.median(timings) * 1000,
+    }
+
+
+def main(args: argparse.Namespace):
+    corpus = asyncio.run(load_corpus(args))
+    queries, corpus = corpus[:args.queries], np.ascontiguousarray(corpus[args.queries:])
+    truth, _ = top_k_similar(queries, corpus, args.k)
+    print(f"📚 {corpus.shape[0]} vectores de dimensión {corpus.shape[1]}, {len(queries)} consultas, recall@{args.k}\n")
+
+    print(f"{'precisión':<9} {'dims':>5} {'×reord':>6} {'recall':>7} {'MB RAM':>8} {'ms/consulta':>12}")
+    with tempfile.TemporaryDirectory() as rescore_dir:
+        for dimensions in csv_ints(args.dimensions):
+            for precision in args.precisions.split(","):
+                # float32 no tiene segunda etapa: el multiplicador no cambia nada
+                multipliers = [1] if precision == "float32" else csv_ints(args.multipliers)
+                for multiplier in multipliers:
+                    row = evaluate(corpus, queries, truth, args.k, precision, dimensions, multiplier, rescore_dir)
+                    print(
+                        f"{precision:<9} {dimensions or corpus.shape[1]:>5} {multiplier:>6} "
+                        f"{row['recall']:>7.3f} {row['memory_mb']:>8.1f} {row['ms']:>12.2f}"
+                    )
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,63 @@
+"""
+Ingesta de documentos en law_frame.law_items
+
+Uso:
+    python ingest.py corpus.jsonl
+    python ingest.py ./leyes --max-tokens 400 --concurrency 8
+    python ingest.py corpus.jsonl --force   # reingerir aunque no haya cambios
+
+Se puede interrumpir y volver a lanzar: los documentos ya escritos y sin
+cambios se saltan gracias al checkpoint local.
+"""
+import argparse
+import asyncio
+
+from dotenv import load_dotenv, find_dotenv
+
+from utils.repository.async_supabase_repository import AsyncSupabaseRepository
+from utils.services.embedding_service import EmbeddingService
+from utils.services.ingestion import IngestionCheckpoint, IngestionPipeline, iter_source_documents
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Chunkea, vectoriza y sube documentos a law_items")
+    parser.add_argument("source", help="Fichero JSONL (source_id/id, content, title) o directorio de .txt/.md")
+    parser.add_argument("--table", default="law_items", help="Tabla destino en el esquema law_frame")
+    parser.add_argument("--provider", default="openai", help="Proveedor de embeddings")
+    parser.add_argument("--model", default=None, help="Modelo de embeddings (por defecto el del proveedor)")
+    parser.add_argument("--dimensions", type=int, default=None, help="Dimensiones de los embeddings (recorte de OpenAI)")
+    parser.add_argument("--max-tokens", type=int, default=500, help="Tokens máximos por chunk")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks por lote de embeddings/upsert")
+    parser.add_argument("--concurrency", type=int, default=4, help="Lotes en paralelo")
+    parser.add_argument("--checkpoint", default=".cache/ingestion.sqlite3", help="Fichero de checkpoint")
+    parser.add_argument("--force", action="store_true", help="Reingerir aunque el contenido no haya cambiado")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    supabase = AsyncSupabaseRepository(schema="law_frame")
+    checkpoint = IngestionCheckpoint(args.checkpoint)
+    # Sin micro-batcher: la ingesta ya agrupa sus propios lotes
+    embedding_service = EmbeddingService(
+        provider=args.provider, model_name=args.model, batch_max_size=0, dimensions=args.dimensions
+    )
+    pipeline = IngestionPipeline(
+        embedding_service=embedding_service,
+        supabase=supabase,
+        checkpoint=checkpoint,
+        table_name=args.table,
+        max_tokens=args.max_tokens,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        force=args.force
+    )
+    try:
+        await pipeline.run(iter_source_documents(args.source))
+    finally:
+        checkpoint.close()
+        await supabase.aclose()
+
+
+if __name__ == "__main__":
+    load_dotenv(find_dotenv())
+    asyncio.run(main(parse_args()))
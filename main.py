@@ -1,15 +1,39 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from middlewares.tracing import TracingMiddleware
 from routes import api
+from routes.llm_create import QuestionJobHandler
+from utils.services.client_registry import ClientRegistry
 
 # NO cargar dotenv en Cloud Run por ahora
 # from dotenv import load_dotenv
 # load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clientes compartidos durante toda la vida del proceso
+    app.state.clients = ClientRegistry()
+    await app.state.clients.start()
+    await app.state.clients.jobs.start(QuestionJobHandler(app.state.clients))
+    try:
+        yield
+    finally:
+        await app.state.clients.aclose()
+
+
 app = FastAPI(
     title="LLM RAG FastAPI",
     description="API para procesamiento de embeddings con OpenAI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Respuestas JSON serializadas con orjson
+    default_response_class=ORJSONResponse
 )
 
-app.include_router(api.router)
\ No newline at end of file
+# Traza por petición: X-Trace-Id de entrada/salida y spans por etapa
+app.add_middleware(TracingMiddleware)
+
+app.include_router(api.router)
@@ -0,0 +1,61 @@
+import os
+import re
+import time
+
+from utils.services.tracing import REQUEST_LATENCY, Trace, start_trace
+
+# Un trace-id recibido solo se reutiliza si es corto y seguro para logs y cabeceras
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI que abre una traza por petición HTTP
+
+    Reutiliza el trace-id de la cabecera TRACE_HEADER (por defecto X-Trace-Id)
+    o genera uno, lo devuelve en la respuesta, mide la petición completa
+    (incluido el cuerpo en streaming) y escribe un resumen por etapas.
+    """
+
+    def __init__(self, app, header_name: str = None):
+        self.app = app
+        self.header_name = (header_name or os.getenv("TRACE_HEADER", "X-Trace-Id")).lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = next((value.decode("latin-1") for key, value in scope["headers"] if key == self.header_name), None)
+        trace_id = incoming if incoming and _VALID_TRACE_ID.match(incoming) else None
+        status = 500
+
+        with start_trace(trace_id) as trace:
+            async def send_with_trace_id(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (self.header_name, trace.trace_id.encode("latin-1"))
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                self._finish(scope, trace, status)
+
+    @staticmethod
+    def _finish(scope, trace: Trace, status: int):
+        elapsed = time.perf_counter() - trace.started_at
+        # La plantilla de la ruta (no la URL) para no disparar la cardinalidad
+        route = getattr(scope.get("route"), "path", "unmatched")
+        REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(elapsed)
+
+        if trace.spans:
+            stages = ", ".join(
+                f"{stage} {data['count']}× {data['seconds']:.2f}s"
+                + (f" ({data['retries']} reintentos)" if data["retries"] else "")
+                for stage, data in sorted(trace.summary().items(), key=lambda item: -item[1]["seconds"])
+            )
+            print(f"🧭 Traza {trace.trace_id} {scope['method']} {scope['path']} {status} {elapsed:.2f}s → {stages}")
@@ -1,14 +1,38 @@
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+
 import jwt
 from jwt import PyJWTError
 import os
 from dotenv import load_dotenv, find_dotenv
 from fastapi import Request, HTTPException
 
+from utils.services.admission import AdmissionRejected
+
 # 🔹 Cargar variables de entorno
 load_dotenv(find_dotenv())
 JWT_SIGNATURE = os.getenv("JWT_SIGNATURE")
 
+# 🔹 Endpoints /admin: roles admitidos en app_metadata del JWT (solo los asigna el
+# backend de Supabase) o token de servicio en X-Admin-Token para despliegues y cron
+ADMIN_ROLES = {role.strip() for role in os.getenv("ADMIN_ROLES", "admin").split(",") if role.strip()}
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# 🔹 Tokens ya verificados (hash -> payload) hasta su exp, para no repetir la firma
+TOKEN_CACHE_ENTRIES = int(os.getenv("TOKEN_CACHE_ENTRIES", "1024"))
+_verified_tokens: "OrderedDict[str, dict]" = OrderedDict()
+
 def validate_token(token: str):
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    cached = _verified_tokens.get(key)
+    if cached is not None:
+        if cached["exp"] > time.time():
+            _verified_tokens.move_to_end(key)
+            return cached
+        del _verified_tokens[key]
+
     try:
         payload = jwt.decode(
             token,
@@ -17,6 +41,11 @@ def validate_token(token: str):
             audience="authenticated",  # 👈 el aud del token, normalmente "authenticated"
             options={"verify_exp": True}  # verifica expiración
         )
+        # Solo se cachean tokens con caducidad; el resultado vale hasta exp
+        if "exp" in payload:
+            _verified_tokens[key] = payload
+            while len(_verified_tokens) > TOKEN_CACHE_ENTRIES:
+                _verified_tokens.popitem(last=False)
         return payload
 
     except jwt.ExpiredSignatureError:
@@ -25,10 +54,10 @@ def validate_token(token: str):
         return {"error": "Invalid token"}
 
 
-def auth_dependency(request: Request):
+def token_dependency(request: Request) -> dict:
     """
-    Dependency para validar JWT.
-    Devuelve el payload si el token es válido.
+    Dependency que solo valida el JWT, sin pasar por el control de admisión.
+    Para endpoints ligeros (p. ej. consultar el estado de un trabajo).
     """
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -39,5 +68,62 @@ def auth_dependency(request: Request):
 
     if "error" in payload:
         raise HTTPException(status_code=401, detail=payload["error"])
+    return payload
+
+
+def admin_dependency(request: Request) -> dict:
+    """
+    Dependency de los endpoints de administración.
+
+    Acepta el token de servicio (cabecera X-Admin-Token igual a ADMIN_TOKEN) o un
+    JWT válido cuyo ``app_metadata.role`` (o alguno de ``app_metadata.roles``)
+    esté en ADMIN_ROLES. Sin ninguno de los dos responde 401/403.
+    """
+    service_token = request.headers.get("X-Admin-Token")
+    if service_token:
+        if ADMIN_TOKEN and hmac.compare_digest(service_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+            return {"sub": "service", "role": "service"}
+        raise HTTPException(status_code=401, detail="Invalid admin token")
 
+    payload = token_dependency(request)
+    metadata = payload.get("app_metadata") or {}
+    roles = set(metadata.get("roles") or [])
+    if metadata.get("role"):
+        roles.add(metadata["role"])
+    if not roles & ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Admin role required")
     return payload
+
+
+async def auth_dependency(request: Request):
+    """
+    Dependency para validar JWT y admitir la petición.
+    Devuelve el payload si el token es válido.
+
+    Después de validar, la petición pasa por el control de admisión del
+    usuario (``sub``): espera turno o recibe un 429 con Retry-After. El hueco
+    se libera al terminar el endpoint; las respuestas en streaming lo mantienen
+    con ``request.state.admission.hold_during(stream)``.
+    """
+    payload = token_dependency(request)
+
+    clients = getattr(request.app.state, "clients", None)
+    if clients is None:
+        yield payload
+        return
+
+    try:
+        ticket = await clients.admission.admit(payload.get("sub") or "anonymous")
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests ({e.reason})",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    request.state.admission = ticket
+    try:
+        yield payload
+    finally:
+        if not ticket.detached:
+            ticket.release()
@@ -1,12 +1,16 @@
 import os
 from typing import Union
 from routes.root import read_root as rr
-from routes.llm_create import create as cre, get_questions as gener
+from routes.llm_create import create as cre, get_questions as gener, stream_questions as gener_stream
 from utils.models.generate_question_model import GenerateQuestionsRequest
-from fastapi import APIRouter, Depends
+from utils.services.client_registry import ClientRegistry, get_registry
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 # 👇 importa la dependencia de auth
-from middlewares.validateToken import auth_dependency
+from middlewares.validateToken import admin_dependency, auth_dependency, token_dependency
 
 router = APIRouter()
 
@@ -16,28 +20,164 @@ def read_root():
     return rr()
 
 @router.get("/create")
-def read_item(prompt: str = '', system: str = '', effort: str = "low", model: str = 'gpt-5-2025-08-07'):
-    return cre(system=system, prompt=prompt, model=model, effort=effort)
+def read_item(
+    prompt: str = '', system: str = '', effort: str = "low", model: str = 'gpt-5-2025-08-07',
+    clients: ClientRegistry = Depends(get_registry)
+):
+    return cre(clients=clients, system=system, prompt=prompt, model=model, effort=effort)
 
 @router.post("/generate_questions")
 async def question_endpoint(
     req: GenerateQuestionsRequest,
-    user=Depends(auth_dependency)  # 🔒 protege solo este endpoint
+    user=Depends(auth_dependency),  # 🔒 protege solo este endpoint
+    clients: ClientRegistry = Depends(get_registry)
 ):
     return await gener(
+        clients=clients,
         topic=req.topic,
         academy=req.academy,
         has4questions=req.has4questions,
         prompt=req.prompt,
         num_of_q=req.num_of_q,
         model=req.llm_model,
+        llm_chunking=req.llm_chunking,
     )
 
+@router.post("/generate_questions/stream")
+async def question_stream_endpoint(
+    req: GenerateQuestionsRequest,
+    request: Request,
+    user=Depends(auth_dependency),
+    clients: ClientRegistry = Depends(get_registry)
+):
+    """Como /generate_questions, pero emite cada pregunta (NDJSON) en cuanto su lote termina"""
+    stream = gener_stream(
+        clients=clients,
+        topic=req.topic,
+        academy=req.academy,
+        has4questions=req.has4questions,
+        prompt=req.prompt,
+        num_of_q=req.num_of_q,
+        model=req.llm_model,
+        llm_chunking=req.llm_chunking,
+    )
+    # El hueco de admisión se mantiene hasta terminar de emitir
+    ticket = request.state.admission
+    return StreamingResponse(
+        ticket.hold_during(stream),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(ticket.release)
+    )
+
+@router.post("/generate_questions/jobs", status_code=202)
+async def question_job_submit(
+    req: GenerateQuestionsRequest,
+    user=Depends(auth_dependency),
+    clients: ClientRegistry = Depends(get_registry)
+):
+    """Encola la generación y responde en el acto con el id del trabajo"""
+    job = await clients.jobs.submit(user.get("sub") or "anonymous", req.model_dump(), req.num_of_q)
+    return {"id": job["id"], "status": job["status"], "status_url": f"/generate_questions/jobs/{job['id']}"}
+
+async def _owned_job(clients: ClientRegistry, user: dict, job_id: str) -> dict:
+    job = await clients.jobs.get(job_id)
+    # Los trabajos de otros usuarios no existen para quien consulta
+    if job is None or job["owner"] != (user.get("sub") or "anonymous"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/generate_questions/jobs/{job_id}")
+async def question_job_status(
+    job_id: str,
+    offset: int = 0,
+    user=Depends(token_dependency),  # consultar no consume cupo de admisión
+    clients: ClientRegistry = Depends(get_registry)
+):
+    """Estado del trabajo y preguntas generadas hasta ahora (desde ``offset``)"""
+    job = await _owned_job(clients, user, job_id)
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "requested": job["requested"],
+        "produced": job["produced"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "offset": offset,
+        "questions": await clients.jobs.results(job_id, offset),
+    }
+
+@router.post("/generate_questions/jobs/{job_id}/cancel")
+async def question_job_cancel(
+    job_id: str,
+    user=Depends(token_dependency),
+    clients: ClientRegistry = Depends(get_registry)
+):
+    """Cancela el trabajo; las preguntas ya guardadas se conservan"""
+    await _owned_job(clients, user, job_id)
+    job = await clients.jobs.cancel(job_id)
+    return {"id": job["id"], "status": job["status"], "cancel_requested": job["cancel_requested"]}
+
+@router.post("/admin/prompts/refresh")
+async def refresh_prompts(
+    user=Depends(admin_dependency),
+    clients: ClientRegistry = Depends(get_registry)
+):
+    """Recarga los prompts de sistema de gpt_prompts sin esperar al TTL"""
+    return {"versions": await clients.agent_repo.refresh_prompts()}
+
+@router.post("/admin/vector-index/reload")
+async def reload_vector_index(
+    user=Depends(admin_dependency),
+    clients: ClientRegistry = Depends(get_registry)
+):
+    """Recarga el índice vectorial en memoria (solo backend "local")"""
+    vector_search = clients.rag.vector_search
+    if vector_search.local_index is None:
+        return {"backend": vector_search.backend, "reloaded": False}
+    await vector_search.load_local_index()
+    return {"backend": vector_search.backend, "reloaded": True, "documents": len(vector_search.local_index.ids)}
+
+@router.post("/admin/retrieval-cache/invalidate")
+def invalidate_retrieval_cache(
+    user=Depends(admin_dependency),
+    clients: ClientRegistry = Depends(get_registry)
+):
+    """Descarta los resultados RAG cacheados (p. ej. tras reingestar law_items)"""
+    clients.rag.retrieval_cache.invalidate()
+    return {"invalidated": True}
+
 @router.get("/health")
 def health_check():
     """Endpoint de salud simple"""
     return {"status": "ok", "port": os.environ.get("PORT", "8080")}
 
+@router.get("/cache/embeddings")
+def embedding_cache_stats(clients: ClientRegistry = Depends(get_registry)):
+    """Debug: aciertos y fallos de la caché de embeddings"""
+    return clients.embedding_cache.stats()
+
+@router.get("/cache/retrieval")
+def retrieval_cache_stats(clients: ClientRegistry = Depends(get_registry)):
+    """Debug: aciertos, fallos y búsquedas compartidas de la caché RAG"""
+    return clients.rag.retrieval_cache.stats()
+
+@router.get("/admission")
+def admission_stats(clients: ClientRegistry = Depends(get_registry)):
+    """Debug: peticiones en curso, en cola y rechazadas por el control de admisión"""
+    return clients.admission.stats()
+
+@router.get("/llm/scheduler")
+def llm_scheduler_stats(clients: ClientRegistry = Depends(get_registry)):
+    """Debug: llamadas al LLM en vuelo, en cola y errores 429 del planificador"""
+    return clients.llm_scheduler.stats()
+
+@router.get("/metrics")
+def metrics():
+    """Métricas Prometheus: latencia, errores, reintentos y tokens por etapa"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @router.get("/env")
 def show_env():
     """Debug: mostrar variables de entorno"""
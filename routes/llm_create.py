@@ -1,10 +1,15 @@
-from utils.repository.openai_repository import OpenAIRepository
-from utils.repository.rag_respository import RAGRepository
-from utils.repository.supabase_repository import SupabaseRepository
+from typing import AsyncIterator
 
-def create(system: str, prompt: str, model: str = None, effort: str = "low"):
+from utils.models.generate_question_model import GenerateQuestionsRequest
+from utils.models.question_model import Question
+from utils.services import tracing
+from utils.services.background_jobs import JobHandler
+from utils.services.client_registry import ClientRegistry
+from utils.tools.serialization import ndjson_line
+
+def create(clients: ClientRegistry, system: str, prompt: str, model: str = None, effort: str = "low"):
     try:
-        client = OpenAIRepository()
+        client = clients.openai
         response = client.generate_text(
             system=system,
             prompt=prompt,
@@ -17,23 +22,33 @@ def create(system: str, prompt: str, model: str = None, effort: str = "low"):
     except Exception as e:
         return {"error": str(e)}, 500
 
-async def get_questions(topic: int, prompt: str, academy: int, model: str, has4questions: bool, num_of_q: int):
-    try:
-        client = OpenAIRepository()
-        SBClient = SupabaseRepository()
-        rag = RAGRepository(embedding_provider="openai", model_name="text-embedding-3-large")
-
-        # context = "rag_context" # información que has sacado del RAG
-        similar_documents = await rag.search_similar_documents(prompt, limit=5)
+async def _retrieve_context(rag, prompt: str) -> list[str]:
+    # Deduplicado y ajustado a presupuesto; un documento por elemento para que el chunker respete sus límites
+    documents = await rag.retrieve_context(prompt)
 
-        # print(f"Documentos similares encontrados: {similar_documents}")
+    # Solo el tamaño: el texto recuperado no se vuelca al log
+    print(f"📚 Contexto RAG obtenido: {len(documents)} documentos, {sum(len(doc) for doc in documents)} caracteres")
+    return documents
 
-        documents = [doc['content'] for doc in similar_documents]
+async def _save_questions(SBClient, questions) -> list[dict]:
+    # guarda en BDD con inserts multi-fila
+    with tracing.span("insert", rows=len(questions)) as current:
+        saved = await SBClient.insert_many(
+            table="questions",
+            rows=Question.to_rows(questions)
+        )
+        current.set(errors=len(saved["errors"]))
+    for error in saved["errors"]:
+        print(f"❌ Error guardando preguntas {error['start']}-{error['start'] + error['count'] - 1}: {error['error']}")
+    return saved["data"]
 
-        documents = ' '.join(documents)
+async def get_questions(clients: ClientRegistry, topic: int, prompt: str, academy: int, model: str, has4questions: bool, num_of_q: int, llm_chunking: bool = False):
+    try:
+        client = clients.openai
+        SBClient = clients.supabase
+        rag = clients.rag
 
-        # print(f"Contexto RAG obtenido: {len(context)} caracteres")
-        print(documents[:1000])  # Mostrar solo los primeros 1000 caracteres para no saturar el log
+        documents = await _retrieve_context(rag, prompt)
 
         response = await client.generate_questions(
             topic=topic,
@@ -42,16 +57,118 @@ async def get_questions(topic: int, prompt: str, academy: int, model: str, has4q
             prompt=prompt,
             num_of_q=num_of_q,
             model=model,
-            context=documents
+            context=documents,
+            llm_chunking=llm_chunking
         )
 
-        for question in response:
-            SBClient.insert(
-                table="questions",
-                data=question.to_json_without_id()
-            ) # guarda en BDD
+        if isinstance(response, list) and response:
+            await _save_questions(SBClient, response)
         # return "Hola"
         return response
 
     except Exception as e:
-        return {"error": str(e)}, 500
\ No newline at end of file
+        return {"error": str(e)}, 500
+
+async def generated_question_batches(clients: ClientRegistry, topic: int, prompt: str, academy: int, model: str, has4questions: bool, num_of_q: int, llm_chunking: bool = False) -> AsyncIterator[list[Question]]:
+    """Genera y revisa preguntas; entrega cada lote sin guardar en cuanto está listo"""
+    documents = await _retrieve_context(clients.rag, prompt)
+
+    async for batch in clients.openai.stream_questions(
+        topic=topic,
+        academy=academy,
+        has4questions=has4questions,
+        prompt=prompt,
+        num_of_q=num_of_q,
+        model=model,
+        context=documents,
+        llm_chunking=llm_chunking
+    ):
+        yield batch
+
+async def saved_question_batches(clients: ClientRegistry, topic: int, prompt: str, academy: int, model: str, has4questions: bool, num_of_q: int, llm_chunking: bool = False) -> AsyncIterator[list[dict]]:
+    """Genera, revisa y guarda preguntas; entrega las filas de cada lote en cuanto está guardado"""
+    async for batch in generated_question_batches(
+        clients=clients,
+        topic=topic,
+        academy=academy,
+        has4questions=has4questions,
+        prompt=prompt,
+        num_of_q=num_of_q,
+        model=model,
+        llm_chunking=llm_chunking
+    ):
+        saved = await _save_questions(clients.supabase, batch)
+        # Si el lote se guardó, se devuelven las filas con su id
+        yield saved if len(saved) == len(batch) else Question.to_rows(batch)
+
+async def stream_questions(clients: ClientRegistry, topic: int, prompt: str, academy: int, model: str, has4questions: bool, num_of_q: int, llm_chunking: bool = False) -> AsyncIterator[bytes]:
+    """
+    Genera preguntas como NDJSON: una línea por pregunta en cuanto su lote está
+    generado, revisado y guardado, y una línea final de tipo "done" o "error".
+    """
+    total = 0
+    try:
+        async for rows in saved_question_batches(
+            clients=clients,
+            topic=topic,
+            academy=academy,
+            has4questions=has4questions,
+            prompt=prompt,
+            num_of_q=num_of_q,
+            model=model,
+            llm_chunking=llm_chunking
+        ):
+            for row in rows:
+                total += 1
+                yield ndjson_line({"type": "question", "question": row})
+
+        yield ndjson_line({"type": "done", "total": total})
+
+    except Exception as e:
+        yield ndjson_line({"type": "error", "error": str(e), "total": total})
+
+class QuestionJobHandler(JobHandler):
+    """
+    Handler de los trabajos en segundo plano: ejecuta un GenerateQuestionsRequest guardado
+
+    Las filas se generan sin id y se insertan en ``save``; al conciliar un lote que
+    quedó a medias se buscan por tema y enunciado las que ya llegaron a la tabla
+    para no insertarlas dos veces.
+    """
+
+    def __init__(self, clients: ClientRegistry):
+        self.clients = clients
+
+    async def generate(self, params: dict, remaining: int) -> AsyncIterator[list[dict]]:
+        req = GenerateQuestionsRequest(**params)
+        async for batch in generated_question_batches(
+            clients=self.clients,
+            topic=req.topic,
+            academy=req.academy,
+            has4questions=req.has4questions,
+            prompt=req.prompt,
+            num_of_q=remaining,
+            model=req.llm_model,
+            llm_chunking=req.llm_chunking,
+        ):
+            yield Question.to_rows(batch)
+
+    async def save(self, params: dict, rows: list[dict], recovering: bool = False) -> list[dict]:
+        existing = await self._existing(rows) if recovering else {}
+        missing = [row for row in rows if row["question"] not in existing]
+        if missing:
+            with tracing.span("insert", rows=len(missing)):
+                saved = await self.clients.supabase.insert_many(table="questions", rows=missing)
+            if saved["errors"]:
+                raise RuntimeError(f"No se pudieron guardar {len(missing) - len(saved['data'])} preguntas: {saved['errors'][0]['error']}")
+            existing.update((row["question"], row) for row in saved["data"])
+        return [existing[row["question"]] for row in rows]
+
+    async def _existing(self, rows: list[dict]) -> dict[str, dict]:
+        """Preguntas del lote que ya están en la tabla, por enunciado"""
+        found = await self.clients.supabase.select(
+            table="questions",
+            filters={"topic": rows[0]["topic"], "by_llm": True},
+            in_filters={"question": [row["question"] for row in rows]}
+        )
+        return {row["question"]: row for row in found}
@@ -0,0 +1,45 @@
+import time
+
+import jwt
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from middlewares import validateToken
+
+SECRET = "test-secret-with-at-least-32-bytes!!"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(validateToken, "JWT_SIGNATURE", SECRET)
+    monkeypatch.setattr(validateToken, "ADMIN_ROLES", {"admin"})
+    monkeypatch.setattr(validateToken, "ADMIN_TOKEN", "service-token")
+    app = FastAPI()
+
+    @app.post("/admin/action")
+    def action(user=Depends(validateToken.admin_dependency)):
+        return {"sub": user["sub"]}
+
+    return TestClient(app)
+
+
+def bearer(**claims) -> dict:
+    payload = {"sub": "alice", "aud": "authenticated", "exp": int(time.time()) + 60, **claims}
+    return {"Authorization": "Bearer " + jwt.encode(payload, SECRET, algorithm="HS256")}
+
+
+def test_regular_user_is_forbidden(client):
+    assert client.post("/admin/action", headers=bearer()).status_code == 403
+    assert client.post("/admin/action", headers=bearer(role="admin")).status_code == 403
+
+
+def test_admin_role_is_allowed(client):
+    assert client.post("/admin/action", headers=bearer(app_metadata={"role": "admin"})).status_code == 200
+    assert client.post("/admin/action", headers=bearer(app_metadata={"roles": ["admin"]})).status_code == 200
+
+
+def test_service_token(client):
+    assert client.post("/admin/action", headers={"X-Admin-Token": "service-token"}).status_code == 200
+    assert client.post("/admin/action", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert client.post("/admin/action").status_code == 401
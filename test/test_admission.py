@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from utils.services.admission import AdmissionController, AdmissionRejected
+
+
+async def _burst(controller: AdmissionController, keys, hold: float = 0.05):
+    async def one(key):
+        try:
+            ticket = await controller.admit(key)
+        except AdmissionRejected as e:
+            return e.reason
+        await asyncio.sleep(hold)
+        ticket.release()
+        return "ok"
+
+    return await asyncio.gather(*[one(key) for key in keys])
+
+
+def test_burst_respects_global_queue_limit():
+    controller = AdmissionController(
+        max_concurrent=2, per_user_concurrency=2, per_user_rpm=0,
+        max_queue=2, per_user_queue=100, max_wait_seconds=5
+    )
+    results = asyncio.run(_burst(controller, [f"user-{i}" for i in range(30)]))
+
+    # 2 en curso + 2 en cola; el resto se rechaza en el acto
+    assert results.count("ok") == 4
+    assert results.count("queue") == 26
+    assert controller.stats()["in_flight"] == 0
+    assert controller.stats()["waiting"] == 0
+
+
+def test_burst_respects_per_user_queue_limit():
+    controller = AdmissionController(
+        max_concurrent=10, per_user_concurrency=1, per_user_rpm=0,
+        max_queue=100, per_user_queue=1, max_wait_seconds=5
+    )
+    results = asyncio.run(_burst(controller, ["alice"] * 10 + ["bob"]))
+
+    # alice: 1 en curso + 1 en cola; bob no se ve afectado
+    assert results[:10].count("ok") == 2
+    assert results[:10].count("queue") == 8
+    assert results[10] == "ok"
+
+
+def test_timeout_refunds_rate_token():
+    async def scenario():
+        controller = AdmissionController(
+            max_concurrent=1, per_user_concurrency=1, per_user_rpm=2,
+            max_queue=10, per_user_queue=10, max_wait_seconds=0.05
+        )
+        held = await controller.admit("alice")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.admit("alice")
+        assert rejected.value.reason == "timeout"
+        held.release()
+        # El token del intento rechazado se devolvió: queda cupo para otra petición
+        ticket = await controller.admit("alice")
+        ticket.release()
+
+    asyncio.run(scenario())
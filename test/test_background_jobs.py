@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from utils.services.background_jobs import BackgroundJobs, JobHandler
+from utils.services.job_store import COMPLETED, JobStore, LeaseLost, SQLiteJobStore
+
+
+class FakeHandler(JobHandler):
+    """Genera filas numeradas y las "guarda" en una tabla en memoria que asigna ids"""
+
+    def __init__(self):
+        self.table = []
+
+    async def generate(self, params, remaining):
+        for _ in range(remaining):
+            yield [{"question": f"{params['prompt']}-{len(self.table)}"}]
+
+    async def save(self, params, rows, recovering=False):
+        existing = {row["question"]: row for row in self.table} if recovering else {}
+        for row in rows:
+            if row["question"] not in existing:
+                saved = {**row, "id": len(self.table) + 1}
+                self.table.append(saved)
+                existing[row["question"]] = saved
+        return [existing[row["question"]] for row in rows]
+
+
+def test_partial_store_fails_on_creation():
+    class PartialStore(JobStore):
+        async def get(self, job_id):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+def test_pending_batch_is_reconciled_without_duplicates(tmp_path):
+    async def scenario():
+        store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+        handler = FakeHandler()
+        job = await store.create("alice", {"prompt": "p"}, 3)
+        claimed = await store.claim()
+
+        # La instancia muere tras insertar el primer lote pero antes de confirmarlo
+        rows = [{"question": "p-0"}]
+        await store.stage_results(job["id"], claimed["lease"], rows)
+        await handler.save(claimed["params"], rows)
+        assert await store.requeue_stale(0) == 1
+
+        jobs = BackgroundJobs(store, workers=1, lease_seconds=60, poll_seconds=0.05)
+        await jobs.start(handler)
+        for _ in range(100):
+            if (await jobs.get(job["id"]))["status"] == COMPLETED:
+                break
+            await asyncio.sleep(0.02)
+        results = await jobs.results(job["id"])
+        await jobs.aclose()
+        return handler.table, results
+
+    table, results = asyncio.run(scenario())
+    assert [row["question"] for row in table] == ["p-0", "p-1", "p-2"]
+    # El lote pendiente se reutiliza: cada pregunta se inserta una sola vez
+    assert len(table) == len({row["question"] for row in table})
+    assert [row["id"] for row in results] == [row["id"] for row in table]
+
+
+def test_stale_lease_cannot_write(tmp_path):
+    async def scenario():
+        store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+        job = await store.create("alice", {"prompt": "p"}, 1)
+        first = await store.claim()
+        await store.requeue_stale(0)
+        second = await store.claim()
+
+        assert not await store.heartbeat(job["id"], first["lease"])
+        with pytest.raises(LeaseLost):
+            await store.stage_results(job["id"], first["lease"], [{"question": "p-0"}])
+        assert await store.heartbeat(job["id"], second["lease"])
+
+    asyncio.run(scenario())
@@ -0,0 +1,40 @@
+import asyncio
+
+from utils.services.embedding_batcher import EmbeddingBatcher
+
+
+def _run_batch(batch_fn, texts):
+    async def scenario():
+        batcher = EmbeddingBatcher(batch_fn, max_batch_size=64, max_wait_ms=1)
+        return await asyncio.wait_for(
+            asyncio.gather(*[batcher.submit(text) for text in texts], return_exceptions=True), 2
+        )
+
+    return asyncio.run(scenario())
+
+
+def test_deduplicates_and_returns_each_vector():
+    calls = []
+
+    async def batch_fn(texts):
+        calls.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    assert _run_batch(batch_fn, ["a", "bb", "a"]) == [[1.0], [2.0], [1.0]]
+    assert calls == [["a", "bb"]]
+
+
+def test_short_result_fails_every_caller_instead_of_hanging():
+    async def batch_fn(texts):
+        return [[0.0]]
+
+    results = _run_batch(batch_fn, ["a", "b", "c"])
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_batch_error_is_propagated():
+    async def batch_fn(texts):
+        raise RuntimeError("boom")
+
+    results = _run_batch(batch_fn, ["a", "b"])
+    assert all(isinstance(result, RuntimeError) for result in results)
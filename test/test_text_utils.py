@@ -0,0 +1,41 @@
+import tiktoken
+
+from utils.tools import text_utils
+
+
+def test_encoding_failure_is_retried(monkeypatch):
+    encoding = object()
+    calls = []
+
+    def get_encoding(name):
+        calls.append(name)
+        if len(calls) == 1:
+            raise OSError("sin red")
+        return encoding
+
+    monkeypatch.setattr(tiktoken, "get_encoding", get_encoding)
+    monkeypatch.setattr(text_utils, "_encoding", None)
+    monkeypatch.setattr(text_utils, "_encoding_failures", 0)
+    monkeypatch.setattr(text_utils, "_encoding_retry_at", 0.0)
+
+    assert text_utils.load_encoding() is None
+    # Durante la espera no se vuelve a intentar
+    assert text_utils.load_encoding() is None
+    assert len(calls) == 1
+
+    monkeypatch.setattr(text_utils, "_encoding_retry_at", 0.0)
+    assert text_utils.load_encoding() is encoding
+    assert text_utils.load_encoding() is encoding
+    assert len(calls) == 2
+
+
+def test_oversized_word_is_split_by_characters():
+    def counter(text):
+        return max(1, len(text) // 4)
+
+    word = "x" * 5000
+    text = f"Intro corta. {word} y final."
+    chunks = list(text_utils.iter_chunks(text, max_tokens=100, token_counter=counter))
+
+    assert max(counter(chunk) for chunk in chunks) <= 100
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
@@ -7,4 +7,5 @@ class GenerateQuestionsRequest(BaseModel):
     academy: int
     has4questions: bool = False
     num_of_q: int = 5
-    llm_model: str = "gpt-5-2025-08-07"
\ No newline at end of file
+    llm_model: str = "gpt-5-2025-08-07"
+    llm_chunking: bool = False
\ No newline at end of file
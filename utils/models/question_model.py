@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Union, List
+from typing import Iterable, Optional, Union, List
 from pydantic import BaseModel, Field
 
 class Question(BaseModel):
@@ -48,23 +48,40 @@ class Question(BaseModel):
     
     def to_json_without_id(self) -> dict:
         """Devuelve un diccionario JSON con todos los atributos del modelo excepto 'id'"""
-        return {
-            "academy": self.academy,
-            "question": self.question,
-            "answer1": self.answer1,
-            "answer2": self.answer2,
-            "answer3": self.answer3,
-            "answer4": self.answer4,
-            "solution": self.solution,
-            
-            "tip": self.tip,
-            "topic": self.topic,
-            "createdAt": self.createdAt.isoformat() if self.createdAt else None,
-            "question_prompt": self.question_prompt,
-            "llm_model": self.llm_model,
-            "order": self.order,
-            "by_llm": True
-        }
+        return Question.to_rows((self,))[0]
+
+    @staticmethod
+    def to_rows(questions: Iterable["Question"]) -> list[dict]:
+        """
+        Filas de la tabla questions (sin 'id') de muchas preguntas de una vez
+
+        Lee los campos directamente del ``__dict__`` de cada modelo, sin pasar por
+        model_dump, y formatea una sola vez las fechas repetidas del lote.
+        """
+        rows = []
+        iso_dates = {}
+        for question in questions:
+            values = question.__dict__
+            created = values["createdAt"]
+            if created is not None and created not in iso_dates:
+                iso_dates[created] = created.isoformat()
+            rows.append({
+                "academy": values["academy"],
+                "question": values["question"],
+                "answer1": values["answer1"],
+                "answer2": values["answer2"],
+                "answer3": values["answer3"],
+                "answer4": values["answer4"],
+                "solution": values["solution"],
+                "tip": values["tip"],
+                "topic": values["topic"],
+                "createdAt": iso_dates[created] if created is not None else None,
+                "question_prompt": values["question_prompt"],
+                "llm_model": values["llm_model"],
+                "order": values["order"],
+                "by_llm": True
+            })
+        return rows
 
     def to_json_with_topic_info(self) -> dict:
         data = self.to_json()
@@ -1,46 +1,74 @@
-from agents import Agent, Runner
-from utils.repository.supabase_repository import SupabaseRepository
+from typing import TYPE_CHECKING, Dict, Tuple
+from utils.repository.async_supabase_repository import AsyncSupabaseRepository
 from utils.models.question_model import Question
+from utils.services.prompt_cache import PromptCache
+
+if TYPE_CHECKING:
+    from agents import Agent
 
 class AgentRepository:
 
-    def __init__(self):
-        self.agent = Agent(
+    def __init__(self, supabase: AsyncSupabaseRepository = None, prompt_cache: PromptCache = None):
+        self.supabase = supabase or AsyncSupabaseRepository()
+        self.prompt_cache = prompt_cache or PromptCache(self.supabase)
+        # nombre -> (versión del prompt, agente); solo se conserva la última versión
+        self._agents: Dict[str, Tuple[str, "Agent"]] = {}
+
+    async def get_agent(self) -> "Agent":
+        """Agente coordinador, reconstruido solo cuando cambia algún prompt"""
+        from agents import Agent
+
+        question_agent = await self.questionAgent()
+        feedback_agent = await self.feedbackAgent()
+        version = f"{self._agents['generate_question'][0]}:{self._agents['feedback'][0]}"
+        return self._memoize("coordinator", version, lambda: Agent(
             name="Tutor Policia Nacional - Coordinador",
             handoff_description="Un tutor coordinador de la Policia Nacional que determina si generar preguntas o dar feedback.",
             instructions="""Eres un coordinador que decide qué acción tomar basándote en la solicitud del usuario:
             - Si el usuario quiere generar preguntas, transfiere al agente questionAgent
             - Si el usuario quiere feedback o análisis de preguntas, transfiere al agente feedbackAgent
             - Si no está claro, pregunta al usuario qué necesita específicamente""",
-            handoffs=[self.questionAgent(), self.feedbackAgent()],
+            handoffs=[question_agent, feedback_agent],
 
-        )
-        self.runner = Runner()
-    
-    def questionAgent(self):
-        SBClient = SupabaseRepository()
-        prompt_data = SBClient.select("gpt_prompts", {"destination": "generate_question"})
-        instructions = prompt_data[0].get("prompt_system", "") if prompt_data else ""
-        return Agent(
+        ))
+
+    async def questionAgent(self):
+        from agents import Agent
+
+        instructions, version = await self.prompt_cache.get("generate_question")
+        return self._memoize("generate_question", version, lambda: Agent(
             name="Generador de Preguntas",
             handoff_description="Un tutor de la Policia Nacional que crea preguntas para exámenes.",
             instructions=instructions,
             output_type=list[Question],
             
-        )
+        ))
 
-    def feedbackAgent(self):
-        SBClient = SupabaseRepository()
-        prompt_data = SBClient.select("gpt_prompts", {"destination": "feedback"})
-        instructions = prompt_data[0].get("prompt_system", "") if prompt_data else ""
-        return Agent(
+    async def feedbackAgent(self):
+        from agents import Agent
+
+        instructions, version = await self.prompt_cache.get("feedback")
+        return self._memoize("feedback", version, lambda: Agent(
             name="Analizador de Feedback",
             handoff_description="Un tutor de la Policia Nacional que proporciona retroalimentación sobre las preguntas.",
             instructions=instructions,
             output_type=list[str]
-        )
+        ))
+
+    async def refresh_prompts(self) -> Dict[str, str]:
+        """Recarga los prompts de sistema; los agentes se reconstruyen en el próximo acceso"""
+        return await self.prompt_cache.refresh(["generate_question", "feedback"])
+
+    def _memoize(self, name: str, version: str, factory) -> "Agent":
+        cached = self._agents.get(name)
+        if cached and cached[0] == version:
+            return cached[1]
+        agent = factory()
+        self._agents[name] = (version, agent)
+        return agent
 
     def chunkAgent(self):
+        from agents import Agent
 
         return Agent(
             name="Chunking Agent",
@@ -56,6 +84,8 @@ class AgentRepository:
         )
 
     def spanishConstitutionAgent(self):
+        from agents import Agent
+
         return Agent(
             name="Agente de la Constitución Española",
             handoff_description="Un agente que proporciona información sobre la Constitución Española.",
@@ -0,0 +1,175 @@
+import asyncio
+import os
+from typing import TYPE_CHECKING
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+class AsyncSupabaseRepository:
+    """
+    Variante asíncrona de SupabaseRepository para usar desde código ``async``.
+
+    El cliente se crea en el primer uso y mantiene una única sesión httpx
+    (con su pool de conexiones) durante toda la vida del repositorio.
+    """
+
+    def __init__(self, schema: str = None):
+        """
+        :param schema: esquema de Postgres fijo para este cliente (por defecto "public")
+        """
+        load_dotenv()
+        self._url = os.getenv("SUPABASE_URL")
+        self._key = os.getenv("SUPABASE_KEY")
+
+        if not self._url or not self._key:
+            raise ValueError("Faltan variables SUPABASE_URL o SUPABASE_KEY en el .env")
+
+        self._schema = schema
+        self._client: "AsyncClient" = None
+        self._client_lock = asyncio.Lock()
+
+    async def get_client(self) -> "AsyncClient":
+        """Devuelve el cliente asíncrono, creándolo la primera vez"""
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    # Import diferido: supabase (gotrue, storage, realtime...) no se carga al arrancar
+                    from supabase import acreate_client, AsyncClientOptions
+
+                    options = AsyncClientOptions(schema=self._schema) if self._schema else AsyncClientOptions()
+                    self._client = await acreate_client(self._url, self._key, options=options)
+        return self._client
+
+    async def select(self, table: str, filters: dict = None, order_by: str = None, order_dir: str = "asc", limit: int = None, offset: int = None, columns: str = "*", in_filters: dict = None):
+        """
+        Selecciona registros de una tabla con filtros, ordenamiento y límite opcionales.
+
+        :param table: nombre de la tabla
+        :param filters: diccionario {columna: valor} para filtrar
+        :param order_by: columna por la que ordenar
+        :param order_dir: "asc" o "desc" (por defecto "asc")
+        :param limit: número máximo de registros a devolver
+        :param offset: primer registro a devolver (para paginar; requiere limit)
+        :param columns: columnas a devolver, separadas por comas (por defecto "*")
+        :param in_filters: diccionario {columna: lista de valores} para filtrar con IN
+        """
+        client = await self.get_client()
+        query = client.table(table).select(columns)
+
+        if filters:
+            for col, val in filters.items():
+                query = query.eq(col, val)
+        if in_filters:
+            for col, values in in_filters.items():
+                query = query.in_(col, list(values))
+
+        if order_by:
+            query = query.order(order_by, desc=(order_dir.lower() == "desc"))
+
+        if limit is not None and offset is not None:
+            query = query.range(offset, offset + limit - 1)
+        elif limit is not None:
+            query = query.limit(limit)
+
+        return (await query.execute()).data
+
+    async def count(self, table: str, filters: dict = None) -> int:
+        """
+        Cuenta los registros de una tabla sin descargarlos.
+
+        :param table: nombre de la tabla
+        :param filters: diccionario {columna: valor} para filtrar
+        """
+        client = await self.get_client()
+        query = client.table(table).select("*", count="exact", head=True)
+        if filters:
+            for col, val in filters.items():
+                query = query.eq(col, val)
+        return (await query.execute()).count or 0
+
+    async def insert(self, table: str, data: dict):
+        client = await self.get_client()
+        return (await client.table(table).insert(data).execute()).data
+
+    async def insert_many(self, table: str, rows: list[dict], chunk_size: int = None):
+        """
+        Inserta varias filas enviando inserts multi-fila por bloques.
+
+        :param table: nombre de la tabla
+        :param rows: lista de diccionarios con las mismas columnas
+        :param chunk_size: filas por petición (por defecto SUPABASE_CHUNK_SIZE o 500)
+        :return: {"data": filas insertadas, "errors": errores por bloque}
+        """
+        client = await self.get_client()
+        return await self._write_many(
+            rows, chunk_size,
+            lambda chunk: client.table(table).insert(chunk)
+        )
+
+    async def upsert_many(self, table: str, rows: list[dict], on_conflict: str = "", ignore_duplicates: bool = False, chunk_size: int = None):
+        """
+        Inserta o actualiza varias filas por bloques.
+
+        :param table: nombre de la tabla
+        :param rows: lista de diccionarios con las mismas columnas
+        :param on_conflict: columnas (separadas por comas) que identifican el conflicto
+        :param ignore_duplicates: si es True, las filas en conflicto se ignoran en vez de actualizarse
+        :param chunk_size: filas por petición (por defecto SUPABASE_CHUNK_SIZE o 500)
+        :return: {"data": filas escritas, "errors": errores por bloque}
+        """
+        client = await self.get_client()
+        return await self._write_many(
+            rows, chunk_size,
+            lambda chunk: client.table(table).upsert(
+                chunk, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates
+            )
+        )
+
+    async def update(self, table: str, data: dict, filters: dict):
+        client = await self.get_client()
+        query = client.table(table).update(data)
+        for col, val in filters.items():
+            query = query.eq(col, val)
+        return (await query.execute()).data
+
+    async def delete(self, table: str, filters: dict):
+        client = await self.get_client()
+        query = client.table(table).delete()
+        for col, val in filters.items():
+            query = query.eq(col, val)
+        return (await query.execute()).data
+
+    async def rpc(self, function: str, params: dict):
+        """
+        Ejecuta una función RPC en el esquema de este cliente.
+
+        :param function: nombre de la función SQL
+        :param params: diccionario con los parámetros de la función
+        """
+        client = await self.get_client()
+        return (await client.rpc(function, params).execute()).data
+
+    async def aclose(self):
+        """Cierra la sesión HTTP del cliente, si llegó a crearse"""
+        if self._client is not None:
+            await self._client.postgrest.aclose()
+
+    async def _write_many(self, rows: list[dict], chunk_size: int, build_query):
+        chunk_size = chunk_size or int(os.getenv("SUPABASE_CHUNK_SIZE", "500"))
+        starts = list(range(0, len(rows), chunk_size))
+        # Los bloques viajan en paralelo sobre el mismo pool de conexiones
+        responses = await asyncio.gather(
+            *[build_query(rows[start:start + chunk_size]).execute() for start in starts],
+            return_exceptions=True
+        )
+
+        result = {"data": [], "errors": []}
+        for start, response in zip(starts, responses):
+            if isinstance(response, Exception):
+                # Un bloque fallido no impide escribir el resto
+                count = len(rows[start:start + chunk_size])
+                result["errors"].append({"start": start, "count": count, "error": str(response)})
+                continue
+            result["data"].extend(response.data or [])
+        return result
@@ -3,14 +3,14 @@ import os
 
 from dotenv import load_dotenv, find_dotenv
 from openai import OpenAI
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List
 
 from utils.models.question_model import Question
 
 from utils.repository.question_repository import QuestionRepository
 
 class OpenAIRepository:
-    def __init__(self, model: str = "gpt-5"):
+    def __init__(self, model: str = "gpt-5", question_repo: Optional[QuestionRepository] = None):
         # Opción A: busca .env hacia arriba automáticamente
         load_dotenv(find_dotenv())
 
@@ -22,6 +22,7 @@ class OpenAIRepository:
             raise ValueError("Missing OPENAI_API_KEY")
         self.client = OpenAI(api_key=api_key)
         self.main_model = model
+        self.question_repo = question_repo
 
     def generate_text(self, system: str,  prompt: str, model: str = None, effort: str = "low") -> str:
         """Generates text using OpenAI's API."""
@@ -43,21 +44,51 @@ class OpenAIRepository:
         academy: int,
         has4questions: bool,
         num_of_q: int,
-        context: str,
+        context: str | list[str],
+        llm_chunking: bool = False,
     ) -> list[Question] | str:
     
         # self.agent_repo = AgentRepository(context=context)
-        self.question_repo = QuestionRepository()
+        if self.question_repo is None:
+            self.question_repo = QuestionRepository()
 
-
-        self.result = await self.question_repo.generate_questions_with_feedback(
+        # Variable local: la instancia se comparte entre peticiones concurrentes
+        result = await self.question_repo.generate_questions_with_feedback(
             topic=topic,
             prompt=prompt,
             academy=academy,
             has4questions=has4questions,
             num_of_q=num_of_q,
             llm_model=model,
-            context=context
+            context=context,
+            use_llm_chunking=llm_chunking
         )
 
-        return self.result
\ No newline at end of file
+        return result
+
+    async def stream_questions(
+        self,
+        topic: int,
+        model: str,
+        prompt: str,
+        academy: int,
+        has4questions: bool,
+        num_of_q: int,
+        context: str | list[str],
+        llm_chunking: bool = False,
+    ) -> AsyncIterator[list[Question]]:
+        """Genera preguntas entregando cada lote (con su feedback) en cuanto está listo"""
+        if self.question_repo is None:
+            self.question_repo = QuestionRepository()
+
+        async for batch in self.question_repo.stream_questions_with_feedback(
+            topic=topic,
+            prompt=prompt,
+            academy=academy,
+            has4questions=has4questions,
+            num_of_q=num_of_q,
+            llm_model=model,
+            context=context,
+            use_llm_chunking=llm_chunking
+        ):
+            yield batch
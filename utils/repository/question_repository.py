@@ -1,66 +1,128 @@
 import asyncio
-import json
+import itertools
 import math
-from typing import List, Dict
-from agents import Runner
-from gotrue import List
+import os
+import time
+from typing import AsyncIterator, List, Dict
 
 from utils.models.question_model import Question
 from utils.repository.agent_repository import AgentRepository
-from utils.repository.supabase_repository import SupabaseRepository
+from utils.repository.async_supabase_repository import AsyncSupabaseRepository
+from utils.services import tracing
+from utils.services.llm_scheduler import LLMScheduler
 from utils.tools.llm_utils import extract_questions_from_response, merge_feedback_into_questions
+from utils.tools.prompt_builder import (
+    QuestionPrompt, build_feedback_prompt, build_question_prompt, source_excerpt, total_tokens
+)
+from utils.tools.retry import retry_async
+from utils.tools.text_utils import chunk_documents, count_tokens
 
 
 
 class QuestionRepository:
-    def __init__(self):
-        self.agent_repo = AgentRepository()
-        self.agent = self.agent_repo.agent
-        self.runner = Runner()
-        self.chunkAgent = self.agent_repo.chunkAgent()
+    def __init__(
+        self,
+        agent_repo: AgentRepository = None,
+        supabase: AsyncSupabaseRepository = None,
+        scheduler: LLMScheduler = None
+    ):
+        self.supabase = supabase or AsyncSupabaseRepository()
+        self.agent_repo = agent_repo or AgentRepository(supabase=self.supabase)
+        # Todas las ejecuciones de agentes pasan por el planificador global
+        self.scheduler = scheduler or LLMScheduler()
+        # Reintentos por lote y reposición hasta llegar a num_of_q (o agotar el plazo)
+        self.max_attempts = int(os.getenv("QUESTION_BATCH_MAX_ATTEMPTS", "3"))
+        self.max_topup_rounds = int(os.getenv("QUESTION_TOPUP_ROUNDS", "2"))
+        self.deadline_seconds = float(os.getenv("QUESTION_GENERATION_DEADLINE", "300"))
+        # Tokens por chunk de contexto: el mismo tamaño que el chunker local usa por defecto,
+        # suficiente para sacar varias preguntas de cada chunk
+        self.chunk_tokens = int(os.getenv("QUESTION_CHUNK_TOKENS", "500"))
+        self._chunk_agent = None
+
+    @property
+    def chunkAgent(self):
+        # Se crea en el primer chunkeo con LLM, no al arrancar (evita importar el SDK de agentes)
+        if self._chunk_agent is None:
+            self._chunk_agent = self.agent_repo.chunkAgent()
+        return self._chunk_agent
 
     async def generate_questions_with_feedback(
         self,
         topic: int,
         prompt: str,
-        context: str | None,
+        context: str | list[str] | None,
         academy: int,
         has4questions: bool,
         num_of_q: int,
         llm_model: str,
-        max_tokens_per_chunk: int = 100,
+        max_tokens_per_chunk: int = None,
         batch_size: int = 30,  # Nuevo parámetro para activar/desactivar RAG # Número de documentos más similares a recuperar
+        use_llm_chunking: bool = False,  # Chunkeo con chunkAgent en vez del chunker local
+    ) -> list[Question] | str:
+        # Las llamadas al LLM de esta petición comparten turno en el planificador
+        with self.scheduler.request_scope():
+            return await self._generate_questions_with_feedback(
+                topic, prompt, context, academy, has4questions, num_of_q,
+                llm_model, max_tokens_per_chunk or self.chunk_tokens, batch_size, use_llm_chunking
+            )
+
+    async def _generate_questions_with_feedback(
+        self, topic, prompt, context, academy, has4questions, num_of_q,
+        llm_model, max_tokens_per_chunk, batch_size, use_llm_chunking
     ) -> list[Question] | str:
         try:
-            SBClient = SupabaseRepository()
+            # Agente coordinador con los prompts vigentes (cacheados con TTL)
+            agent = await self.agent_repo.get_agent()
 
             # Obtener orden inicial
-            current_order = self._get_current_order(SBClient, topic)
+            current_order = await self._get_current_order(self.supabase, topic)
 
             # Chunkear contexto
-            chunks, use_context_chunks = await self._chunk_context(
-                context, max_tokens_per_chunk, batch_size
-            )
+            with tracing.span("chunking", llm=use_llm_chunking) as chunk_span:
+                chunks, use_context_chunks = await self._chunk_context(
+                    context, max_tokens_per_chunk, batch_size, use_llm_chunking
+                )
+                chunk_span.set(chunks=len(chunks))
 
             # Preparar prompts de generación de preguntas
             parallel_prompts = self._generate_question_prompts(
                 prompt, chunks, use_context_chunks,
-                num_of_q, batch_size,
-                academy, topic, llm_model, has4questions
+                num_of_q, batch_size, has4questions
             )
 
-            # Ejecutar y procesar respuestas de preguntas
-            questions = await self._process_question_responses(
-                parallel_prompts, current_order,
-                academy, topic, llm_model
-            )
+            deadline = time.monotonic() + self.deadline_seconds
+            questions: list[Question] = []
+            topup_round = 0
+            while parallel_prompts:
+                # Cada lote pasa a su agente de feedback en cuanto se genera,
+                # sin esperar al resto de generaciones
+                print(f"🚀 Ejecutando {len(parallel_prompts)} lotes generación→feedback en paralelo...")
+                batches = await asyncio.gather(
+                    *[
+                        self._generate_batch_with_retry(agent, p, academy, topic, llm_model, deadline)
+                        for p in parallel_prompts
+                    ],
+                    return_exceptions=True
+                )
 
-            # Generar feedback
-            if questions:
-                questions_with_feedback = await self._generate_feedback(
-                    questions, academy, topic, batch_size
+                # El orden se asigna por posición del lote, no por cuál terminó antes
+                for i, batch in enumerate(batches):
+                    if isinstance(batch, Exception):
+                        print(f"❌ Error en lote de preguntas {i}: {batch}")
+                        continue
+                    for q in batch:
+                        q.order = current_order
+                        current_order += 1
+                    questions.extend(batch)
+
+                topup_round += 1
+                parallel_prompts = self._top_up_prompts(
+                    len(questions), topup_round, deadline,
+                    prompt, chunks, use_context_chunks, num_of_q, batch_size, has4questions
                 )
-                return questions_with_feedback
+
+            if questions:
+                return questions
 
             print("❌ No se generaron preguntas, devolviendo lista vacía")
             return []
@@ -71,6 +133,166 @@ class QuestionRepository:
             print(f"❌ Error en generate_questions_with_feedback: {e}\n{error_details}")
             return f"Error al generar preguntas y feedback: {e}"
 
+    async def stream_questions_with_feedback(
+        self,
+        topic: int,
+        prompt: str,
+        context: str | list[str] | None,
+        academy: int,
+        has4questions: bool,
+        num_of_q: int,
+        llm_model: str,
+        max_tokens_per_chunk: int = None,
+        batch_size: int = 30,
+        use_llm_chunking: bool = False,
+    ) -> AsyncIterator[list[Question]]:
+        """
+        Igual que generate_questions_with_feedback, pero entrega cada lote en cuanto
+        su generación y su feedback terminan (orden de finalización, no de lanzamiento).
+        El campo ``order`` sí sale de la posición del lote, como sin streaming: cada
+        lote numera desde la suma de las preguntas pedidas a los anteriores, y las
+        que traiga de más van tras los de su ronda. Un lote fallido deja un hueco.
+        """
+        agent = await self.agent_repo.get_agent()
+        current_order = await self._get_current_order(self.supabase, topic)
+
+        # Un generador no puede fijar la clave en su propio contexto: cada tarea la recibe
+        request_key = self.scheduler.new_request_key()
+        with tracing.span("chunking", llm=use_llm_chunking) as chunk_span:
+            chunks, use_context_chunks = await asyncio.create_task(self.scheduler.scoped(
+                request_key,
+                self._chunk_context(context, max_tokens_per_chunk or self.chunk_tokens, batch_size, use_llm_chunking)
+            ))
+            chunk_span.set(chunks=len(chunks))
+        parallel_prompts = self._generate_question_prompts(
+            prompt, chunks, use_context_chunks,
+            num_of_q, batch_size, has4questions
+        )
+
+        deadline = time.monotonic() + self.deadline_seconds
+        produced = 0
+        topup_round = 0
+        while parallel_prompts:
+            print(f"🚀 Ejecutando {len(parallel_prompts)} lotes generación→feedback en streaming...")
+            # Primer order de cada lote según su posición; los sobrantes, tras la ronda
+            bases = list(itertools.accumulate((p.num_questions for p in parallel_prompts), initial=current_order))
+            overflow_order = bases[-1]
+            tasks = [
+                asyncio.create_task(self.scheduler.scoped(
+                    request_key,
+                    self._indexed(i, self._generate_batch_with_retry(agent, p, academy, topic, llm_model, deadline))
+                ))
+                for i, p in enumerate(parallel_prompts)
+            ]
+            try:
+                for next_batch in asyncio.as_completed(tasks):
+                    try:
+                        i, batch = await next_batch
+                    except Exception as e:
+                        print(f"❌ Error en lote de preguntas: {e}")
+                        continue
+                    for position, q in enumerate(batch):
+                        if position < parallel_prompts[i].num_questions:
+                            q.order = bases[i] + position
+                        else:
+                            q.order = overflow_order
+                            overflow_order += 1
+                    produced += len(batch)
+                    yield batch
+            finally:
+                # Si el cliente se desconecta no seguimos gastando llamadas al LLM
+                for task in tasks:
+                    task.cancel()
+            current_order = overflow_order
+
+            topup_round += 1
+            parallel_prompts = self._top_up_prompts(
+                produced, topup_round, deadline,
+                prompt, chunks, use_context_chunks, num_of_q, batch_size, has4questions
+            )
+
+    @staticmethod
+    async def _indexed(index: int, coro):
+        """Resultado de ``coro`` junto a su posición (as_completed no la conserva)"""
+        return index, await coro
+
+    async def _generate_batch_with_retry(
+        self, agent, prompt: QuestionPrompt, academy: int, topic: int, llm_model: str, deadline: float
+    ) -> list[Question]:
+        """Genera y revisa un lote reintentándolo (backoff con jitter) si falla o llega vacío"""
+        async def attempt() -> list[Question]:
+            batch = await self._generate_and_review_batch(agent, prompt, academy, topic, llm_model, deadline)
+            if not batch:
+                raise ValueError("el lote no devolvió preguntas")
+            return batch
+
+        with tracing.span("batch") as batch_span:
+            batch = await retry_async(
+                attempt, max_attempts=self.max_attempts, deadline=deadline,
+                label="Lote de preguntas", on_retry=batch_span.retry
+            )
+            batch_span.set(questions=len(batch))
+            return batch
+
+    async def _generate_and_review_batch(
+        self, agent, prompt: QuestionPrompt, academy: int, topic: int, llm_model: str, deadline: float = None
+    ) -> list[Question]:
+        """Genera un lote de preguntas y le pasa directamente su agente de feedback"""
+        response = await self.scheduler.run(agent, prompt.text, stage="agent.generation")
+        questions = extract_questions_from_response(
+            response.final_output_as(list[Question]),
+            academy, topic, llm_model
+        )
+        if not questions:
+            return []
+
+        # Los metadatos ya no van en el prompt: se fijan aquí en vez de pedírselos al modelo
+        excerpt = source_excerpt(prompt.source)
+        for q in questions:
+            q.academy, q.topic, q.llm_model, q.question_prompt = academy, topic, llm_model, excerpt
+
+        async def review() -> list[str]:
+            feedback = await self.scheduler.run(
+                agent, build_feedback_prompt(questions, academy, topic), stage="agent.feedback"
+            )
+            feedbacks = feedback.final_output_as(list[str])
+            # Con un número distinto de feedbacks los tips quedarían desalineados
+            if len(feedbacks) != len(questions):
+                raise ValueError(f"{len(feedbacks)} feedbacks para {len(questions)} preguntas")
+            return feedbacks
+
+        with tracing.span("review") as review_span:
+            try:
+                feedbacks = await retry_async(
+                    review, max_attempts=self.max_attempts, deadline=deadline,
+                    label="Feedback", on_retry=review_span.retry
+                )
+            except Exception as e:
+                print(f"❌ Error procesando feedback: {e}")
+                review_span.set(failed=True)
+                feedbacks = []
+        return merge_feedback_into_questions(questions, feedbacks)
+
+    def _top_up_prompts(
+        self, produced: int, topup_round: int, deadline: float,
+        prompt: str, chunks: list[str], use_chunks: bool, num_of_q: int, batch_size: int,
+        has4questions: bool
+    ) -> list[QuestionPrompt]:
+        """Prompts para reponer las preguntas que faltan, o [] si no hace falta o no queda plazo"""
+        shortfall = num_of_q - produced
+        if shortfall <= 0:
+            return []
+        if topup_round > self.max_topup_rounds or time.monotonic() >= deadline:
+            print(f"⚠️ Se generaron {produced}/{num_of_q} preguntas; sin rondas ni plazo para reponer")
+            return []
+
+        print(f"🔁 Faltan {shortfall} preguntas: ronda de reposición {topup_round}")
+        # Se rotan los chunks para no repetir los mismos textos de la ronda anterior
+        return self._generate_question_prompts(
+            prompt, chunks, use_chunks, shortfall, batch_size, has4questions,
+            chunk_offset=topup_round * batch_size
+        )
+
     # 🔹 Nuevo método para procesar contexto con RAG
 
     def _combine_contexts(self, original_context: str, similar_docs: List[Dict]) -> str:
@@ -93,40 +315,52 @@ class QuestionRepository:
 
 
     # 🔹 Métodos auxiliares existentes (sin cambios)
-    def _get_current_order(self, SBClient, topic: int) -> int:
-        last_order_data = SBClient.select(
-            "questions",
-            filters={"topic": topic},
-            order_by="order",
-            order_dir="desc",
-            limit=1
-        )
+    async def _get_current_order(self, SBClient: AsyncSupabaseRepository, topic: int) -> int:
+        with tracing.span("order_lookup"):
+            last_order_data = await SBClient.select(
+                "questions",
+                filters={"topic": topic},
+                order_by="order",
+                order_dir="desc",
+                limit=1
+            )
         return (last_order_data[0]["order"] if last_order_data else 0) + 1
 
-    async def _chunk_context(self, context: str | None, max_tokens: int, batch_size: int) -> tuple[list[str], bool]:
-        if not context or not context.strip():
+    async def _chunk_context(
+        self, context: str | list[str] | None, max_tokens: int, batch_size: int, use_llm: bool = False
+    ) -> tuple[list[str], bool]:
+        # Una lista de documentos conserva sus límites: ningún chunk mezcla dos fuentes
+        documents = [context] if isinstance(context, str) else list(context or [])
+        documents = [doc.strip() for doc in documents if doc and doc.strip()]
+        if not documents:
             print("⚠️ No hay contexto, se generarán preguntas solo con el prompt.")
             return [], False
 
-        context = context.strip()
+        context = "\n\n".join(documents)
         context_length = len(context)
         
-        # Estimar tokens aproximados (1 token ≈ 4 caracteres para texto en español/inglés)
-        estimated_tokens = context_length // 4
+        # Tokens reales (tiktoken) o estimados si no está disponible
+        estimated_tokens = count_tokens(context)
         
-        print(f"📊 Analizando contexto: {context_length} chars (~{estimated_tokens} tokens)")
+        print(f"📊 Analizando contexto: {len(documents)} documentos, {context_length} chars (~{estimated_tokens} tokens)")
         
         # Si el contexto es pequeño, no hace falta chunkearlo
-        if estimated_tokens <= max_tokens * 1.2:  # 20% de margen de seguridad
+        if len(documents) == 1 and estimated_tokens <= max_tokens * 1.2:  # 20% de margen de seguridad
             print("✅ Contexto pequeño, no requiere chunkeo")
             return [context], True
+
+        if not use_llm:
+            # Chunkeo local por párrafos y oraciones, sin llamadas al LLM
+            chunks = list(chunk_documents(documents, max_tokens))
+            print(f"✅ Chunkeo local completado: {len(chunks)} chunks generados")
+            return chunks, True
         
-        print(f"📊 Contexto largo detectado, iniciando chunkeo paralelo...")
+        print(f"📊 Contexto largo detectado, iniciando chunkeo paralelo con LLM...")
         sections_for_chunking = min(batch_size, max(1, context_length // 2000))
 
         if sections_for_chunking == 1:
             # Chunkeo simple
-            chunk_response = await self.runner.run(self.chunkAgent, f"""
+            chunk_response = await self.scheduler.run(self.chunkAgent, f"""
             Devuelve este contexto en chunks que tengan longitud máxima de {max_tokens} tokens:
 
             {context}
@@ -135,7 +369,7 @@ class QuestionRepository:
             {{
                 "chunks": ["chunk 1", "chunk 2"]
             }}
-            """)
+            """, stage="agent.chunking")
             chunks = chunk_response.final_output_as(list[str])
             print(f"✅ Chunkeo simple completado: {len(chunks)} chunks generados")
             return chunks, True
@@ -160,7 +394,7 @@ class QuestionRepository:
 
         print(f"🚀 Ejecutando {sections_for_chunking} agentes de chunkeo en paralelo...")
         chunk_responses = await asyncio.gather(
-            *[self.runner.run(self.chunkAgent, prompt) for prompt in chunk_prompts],
+            *[self.scheduler.run(self.chunkAgent, prompt, stage="agent.chunking") for prompt in chunk_prompts],
             return_exceptions=True
         )
 
@@ -180,128 +414,20 @@ class QuestionRepository:
 
     def _generate_question_prompts(
         self, prompt: str, chunks: list[str], use_chunks: bool,
-        num_of_q: int, batch_size: int,
-        academy: int, topic: int, llm_model: str, has4questions: bool
-    ) -> list[str]:
+        num_of_q: int, batch_size: int, has4questions: bool,
+        chunk_offset: int = 0
+    ) -> list[QuestionPrompt]:
         num_parallel = min(batch_size, num_of_q)
         per_exec, extra = divmod(num_of_q, num_parallel)
 
         prompts = []
         for i in range(num_parallel):
             q_count = per_exec + (1 if i < extra else 0)
-            if use_chunks:
-                chunk = chunks[i % len(chunks)]
-                question_prompt = f"""{prompt}
-                Genera {q_count} preguntas basadas en este texto:
-
-                "{chunk}"
-
-                Devuelve EXACTAMENTE este formato JSON:
-                {{
-                    "questions": [
-                        {{
-                            "academy": "{academy}",
-                            "question": "Texto de la pregunta aquí",
-                            "answer1": "Primera opción",
-                            "answer2": "Segunda opción",
-                            "answer3": "Tercera opción",
-                            "answer4": {"'Cuarta opción'" if has4questions else "null"},
-                            "solution": 1,
-                            "tip": "Consejo opcional",
-                            "topic": {topic},
-                            "question_prompt": "{chunk[:200]}...",
-                            "retro_text": "",
-                            "by_llm": true,
-                            "llm_model": "{llm_model}"
-                        }}
-                    ]
-                }}"""
-            else:
-                question_prompt = f"""{prompt}
-                Genera {q_count} preguntas basadas únicamente en el tema.
-
-                Devuelve EXACTAMENTE este formato JSON:
-                {{
-                    "questions": [
-                        {{
-                            "academy": "{academy}",
-                            "question": "Texto de la pregunta aquí",
-                            "answer1": "Primera opción",
-                            "answer2": "Segunda opción",
-                            "answer3": "Tercera opción",
-                            "answer4": {"'Cuarta opción'" if has4questions else "null"},
-                            "solution": 1,
-                            "tip": "Consejo opcional",
-                            "topic": {topic},
-                            "question_prompt": "{prompt[:200]}...",
-                            "retro_text": "",
-                            "by_llm": true,
-                            "llm_model": "{llm_model}"
-                        }}
-                    ]
-                }}"""
-            prompts.append(question_prompt)
-        return prompts
+            chunk = chunks[(chunk_offset + i) % len(chunks)] if use_chunks else None
+            prompts.append(build_question_prompt(prompt, q_count, has4questions, chunk))
 
-    async def _process_question_responses(self, prompts, current_order, academy, topic, llm_model):
-        print(f"🚀 Ejecutando {len(prompts)} agentes en paralelo...")
-        responses = await asyncio.gather(
-            *[self.runner.run(self.agent, prompt) for prompt in prompts],
-            return_exceptions=True
+        print(
+            f"🧮 {len(prompts)} prompts de generación: {total_tokens(prompts)} tokens de entrada "
+            f"(máx. {max(p.tokens for p in prompts)} por prompt)"
         )
-
-        questions: list[Question] = []
-        for response in responses:
-            if isinstance(response, Exception):
-                continue
-            try:
-                chunk_questions = extract_questions_from_response(
-                    response.final_output_as(list[Question]),
-                    academy, topic, llm_model
-                )
-                for q in chunk_questions:
-                    q.order = current_order
-                    current_order += 1
-                questions.extend(chunk_questions)
-            except Exception as e:
-                print(f"❌ Error procesando respuesta: {e}")
-        return questions
-
-    async def _generate_feedback(self, questions: list[Question], academy: int, topic: int, batch_size: int) -> list[Question]:
-        print(f"🔄 Generando feedback para {len(questions)} preguntas...")
-        num_agents = min(batch_size, len(questions))
-        per_agent, extra = divmod(len(questions), num_agents)
-
-        feedback_prompts = []
-        start = 0
-        for i in range(num_agents):
-            count = per_agent + (1 if i < extra else 0)
-            subset = questions[start:start+count]
-            subset_dict = [q.model_dump() for q in subset]
-            feedback_prompts.append(f"""
-            Analiza estas preguntas para el topic {topic} y academia {academy}:
-
-            {json.dumps(subset_dict, ensure_ascii=False, indent=2, default=str)}
-
-            Devuelve estrictamente un JSON:
-            {{
-                "feedbacks": ["Explicación 1...", "Explicación 2..."]
-            }}
-            """)
-            start += count
-
-        responses = await asyncio.gather(
-            *[self.runner.run(self.agent, p) for p in feedback_prompts],
-            return_exceptions=True
-        )
-
-        all_feedbacks = []
-        for response in responses:
-            if isinstance(response, Exception):
-                continue
-            try:
-                all_feedbacks.extend(response.final_output_as(list[str]))
-            except Exception as e:
-                print(f"❌ Error procesando feedback: {e}")
-
-        return merge_feedback_into_questions(questions, all_feedbacks)
\ No newline at end of file
+        return prompts
@@ -1,27 +1,50 @@
 # utils/rag/rag_service.py
+import os
 from typing import List, Dict, Any, Optional
 
+from utils.services import tracing
+from utils.services.embedding_cache import EmbeddingCache
 from utils.services.embedding_service import EmbeddingService
+from utils.services.retrieval_cache import RetrievalCache
 from utils.services.vector_search import VectorSearchService
+from utils.tools.context_assembler import assemble_context
 
 class RAGRepository:
     """
     Servicio completo de RAG que combina embedding y búsqueda vectorial
     """
     
-    def __init__(self, embedding_provider: str = "openai", model_name: Optional[str] = None):
+    def __init__(
+        self,
+        embedding_provider: str = "openai",
+        model_name: Optional[str] = None,
+        embedding_service: Optional[EmbeddingService] = None,
+        vector_search: Optional[VectorSearchService] = None,
+        retrieval_cache: Optional[RetrievalCache] = None
+    ):
         """
         Inicializa el servicio RAG
         
         Args:
             embedding_provider: "openai" o "sentence_transformers"
             model_name: Nombre específico del modelo
+            embedding_service: Servicio de embeddings compartido (opcional)
+            vector_search: Servicio de búsqueda vectorial compartido (opcional)
+            retrieval_cache: Caché de resultados de búsqueda (opcional)
         """
-        self.embedding_service = EmbeddingService(
+        self.embedding_service = embedding_service or EmbeddingService(
             provider=embedding_provider, 
             model_name=model_name
         )
-        self.vector_search = VectorSearchService()
+        self.vector_search = vector_search or VectorSearchService()
+        self.retrieval_cache = retrieval_cache
+
+        # Ensamblado del contexto de generación (ver retrieve_context)
+        self.context_max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+        self.context_candidates = int(os.getenv("CONTEXT_CANDIDATES", "10"))
+        self.context_dedup_threshold = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+        mmr_lambda = os.getenv("CONTEXT_MMR_LAMBDA", "")
+        self.context_mmr_lambda = float(mmr_lambda) if mmr_lambda else None
         
     async def search_similar_documents(
         self, 
@@ -42,24 +65,22 @@ class RAGRepository:
         """
         try:
             print(f"🔍 Procesando consulta: '{query[:100]}...'")
-            
-            # 1. Generar embedding de la consulta
-            query_embedding = await self.embedding_service.generate_embedding(query)
-            print(f"✅ Embedding generado. Dimensión: {len(query_embedding)}")
-            
-            # 2. Buscar documentos similares
-            similar_docs = await self.vector_search.search_similar_vectors(
-                embedding=query_embedding,
-                limit=limit
-            )
-            
-            # 3. Filtrar por similitud mínima si se especifica
-            if min_similarity > 0:
-                similar_docs = [
-                    doc for doc in similar_docs 
-                    if doc.get("similarity", 0) >= min_similarity
-                ]
-                print(f"📊 Documentos filtrados por similitud >= {min_similarity}: {len(similar_docs)}")
+
+            with tracing.span("retrieval", limit=limit) as current:
+                if self.retrieval_cache is not None:
+                    # Consultas idénticas (también simultáneas) comparten embedding y búsqueda
+                    key = (
+                        EmbeddingCache.normalize(query), self.embedding_service.model_key,
+                        limit, min_similarity
+                    )
+                    similar_docs = await self.retrieval_cache.get_or_load(
+                        key,
+                        await self.vector_search.get_corpus_version(),
+                        lambda: self._search(query, limit, min_similarity)
+                    )
+                else:
+                    similar_docs = await self._search(query, limit, min_similarity)
+                current.set(results=len(similar_docs))
             
             # 4. Agregar información adicional
             for i, doc in enumerate(similar_docs):
@@ -73,6 +94,55 @@ class RAGRepository:
             print(f"❌ Error en búsqueda RAG: {e}")
             return []
     
+    async def _search(self, query: str, limit: int, min_similarity: float) -> List[Dict[str, Any]]:
+        # 1. Generar embedding de la consulta
+        query_embedding = await self.embedding_service.generate_embedding(query)
+        print(f"✅ Embedding generado. Dimensión: {len(query_embedding)}")
+        
+        # 2. Buscar documentos similares
+        similar_docs = await self.vector_search.search_similar_vectors(
+            embedding=query_embedding,
+            limit=limit
+        )
+        
+        # 3. Filtrar por similitud mínima si se especifica
+        if min_similarity > 0:
+            similar_docs = [
+                doc for doc in similar_docs 
+                if doc.get("similarity", 0) >= min_similarity
+            ]
+            print(f"📊 Documentos filtrados por similitud >= {min_similarity}: {len(similar_docs)}")
+        return similar_docs
+
+    async def retrieve_context(
+        self,
+        query: str,
+        max_tokens: Optional[int] = None,
+        candidates: Optional[int] = None
+    ) -> List[str]:
+        """
+        Contexto para generación: un texto por documento, sin duplicados y dentro de presupuesto
+
+        Recupera más candidatos de los que caben, descarta pasajes casi
+        duplicados o contenidos en otros y (con CONTEXT_MMR_LAMBDA) prioriza
+        la diversidad, hasta llenar max_tokens.
+
+        Args:
+            query: Consulta del usuario
+            max_tokens: Presupuesto de tokens (por defecto CONTEXT_MAX_TOKENS o 3000)
+            candidates: Documentos a recuperar (por defecto CONTEXT_CANDIDATES o 10)
+        """
+        docs = await self.search_similar_documents(query, limit=candidates or self.context_candidates)
+        with tracing.span("context_assembly", candidates=len(docs)) as current:
+            context = assemble_context(
+                docs,
+                max_tokens or self.context_max_tokens,
+                dedup_threshold=self.context_dedup_threshold,
+                mmr_lambda=self.context_mmr_lambda
+            )
+            current.set(documents=len(context))
+        return context
+
     async def search_and_format_context(
         self, 
         query: str, 
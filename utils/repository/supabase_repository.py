@@ -1,9 +1,17 @@
 import os
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from supabase import create_client, Client
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 class SupabaseRepository:
-    def __init__(self):
+    def __init__(self, schema: str = None):
+        """
+        :param schema: esquema de Postgres fijo para este cliente (por defecto "public").
+            Usar un cliente por esquema evita ``client.schema(...)``, que crea una sesión
+            HTTP nueva en cada llamada.
+        """
         load_dotenv()
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_KEY")
@@ -11,7 +19,11 @@ class SupabaseRepository:
         if not url or not key:
             raise ValueError("Faltan variables SUPABASE_URL o SUPABASE_KEY en el .env")
 
-        self.client: Client = create_client(url, key)
+        # Import diferido: solo se paga al crear el primer cliente síncrono
+        from supabase import create_client, ClientOptions
+
+        options = ClientOptions(schema=schema) if schema else ClientOptions()
+        self.client: "Client" = create_client(url, key, options=options)
 
     def select(self, table: str, filters: dict = None, order_by: str = None, order_dir: str = "asc", limit: int = None):
         """
@@ -45,6 +57,50 @@ class SupabaseRepository:
     def insert(self, table: str, data: dict):
         return self.client.table(table).insert(data).execute().data
 
+    def insert_many(self, table: str, rows: list[dict], chunk_size: int = None):
+        """
+        Inserta varias filas enviando inserts multi-fila por bloques.
+
+        :param table: nombre de la tabla
+        :param rows: lista de diccionarios con las mismas columnas
+        :param chunk_size: filas por petición (por defecto SUPABASE_CHUNK_SIZE o 500)
+        :return: {"data": filas insertadas, "errors": errores por bloque}
+        """
+        return self._write_many(
+            rows, chunk_size,
+            lambda chunk: self.client.table(table).insert(chunk)
+        )
+
+    def upsert_many(self, table: str, rows: list[dict], on_conflict: str = "", ignore_duplicates: bool = False, chunk_size: int = None):
+        """
+        Inserta o actualiza varias filas por bloques.
+
+        :param table: nombre de la tabla
+        :param rows: lista de diccionarios con las mismas columnas
+        :param on_conflict: columnas (separadas por comas) que identifican el conflicto
+        :param ignore_duplicates: si es True, las filas en conflicto se ignoran en vez de actualizarse
+        :param chunk_size: filas por petición (por defecto SUPABASE_CHUNK_SIZE o 500)
+        :return: {"data": filas escritas, "errors": errores por bloque}
+        """
+        return self._write_many(
+            rows, chunk_size,
+            lambda chunk: self.client.table(table).upsert(
+                chunk, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates
+            )
+        )
+
+    def _write_many(self, rows: list[dict], chunk_size: int, build_query):
+        chunk_size = chunk_size or int(os.getenv("SUPABASE_CHUNK_SIZE", "500"))
+        result = {"data": [], "errors": []}
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                result["data"].extend(build_query(chunk).execute().data or [])
+            except Exception as e:
+                # Un bloque fallido no impide escribir el resto
+                result["errors"].append({"start": start, "count": len(chunk), "error": str(e)})
+        return result
+
     def update(self, table: str, data: dict, filters: dict):
         query = self.client.table(table).update(data)
         for col, val in filters.items():
@@ -56,3 +112,12 @@ class SupabaseRepository:
         for col, val in filters.items():
             query = query.eq(col, val)
         return query.execute().data
+
+    def rpc(self, function: str, params: dict):
+        """
+        Ejecuta una función RPC en el esquema de este cliente.
+
+        :param function: nombre de la función SQL
+        :param params: diccionario con los parámetros de la función
+        """
+        return self.client.rpc(function, params).execute().data
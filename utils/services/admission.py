@@ -0,0 +1,170 @@
+# utils/services/admission.py
+import asyncio
+import math
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Hashable, Optional
+
+from prometheus_client import Counter
+
+from utils.tools.concurrency import FairLimiter, TokenBucket
+
+ADMISSION_REJECTED = Counter(
+    "llm_rag_admission_rejected_total", "Peticiones rechazadas por el control de admisión", ["reason"]
+)
+
+
+class AdmissionRejected(Exception):
+    """La petición no se admite ahora; ``retry_after`` sugiere cuántos segundos esperar"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionTicket:
+    """Hueco concedido a una petición; se libera una sola vez al terminar"""
+
+    def __init__(self, controller: "AdmissionController", key: Hashable):
+        self._controller = controller
+        self.key = key
+        self.admitted_at = time.monotonic()
+        self.released = False
+        self.detached = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+    def hold_during(self, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """
+        Mantiene el hueco mientras se consume ``stream`` (respuestas en streaming)
+
+        Las dependencias de FastAPI terminan antes de enviar el cuerpo, así que
+        la liberación pasa al generador devuelto. Como este podría no llegar a
+        iniciarse, conviene liberar también al acabar la respuesta (es idempotente).
+        """
+        self.detached = True
+        return self._relay(stream)
+
+    async def _relay(self, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        try:
+            async for item in stream:
+                yield item
+        finally:
+            self.release()
+
+
+class AdmissionController:
+    """
+    Control de admisión por usuario delante del pipeline de generación
+
+    - Límite global de peticiones en curso, repartido por turnos entre usuarios
+      (un usuario con muchas peticiones no bloquea a los demás).
+    - Límite de peticiones en curso y de peticiones por minuto por usuario.
+    - Cola de espera acotada (global y por usuario) y espera máxima; si no hay
+      sitio, se rechaza con un Retry-After estimado en vez de encolar sin fin.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        per_user_concurrency: Optional[int] = None,
+        per_user_rpm: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        per_user_queue: Optional[int] = None,
+        max_wait_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            max_concurrent: Peticiones en curso en total (por defecto ADMISSION_MAX_CONCURRENT o 16)
+            per_user_concurrency: En curso por usuario (por defecto ADMISSION_USER_CONCURRENCY o 2)
+            per_user_rpm: Peticiones por minuto por usuario (por defecto ADMISSION_USER_RPM o 20; 0 = sin límite)
+            max_queue: Peticiones esperando en total (por defecto ADMISSION_MAX_QUEUE o 64)
+            per_user_queue: Esperando por usuario (por defecto ADMISSION_USER_QUEUE o 4)
+            max_wait_seconds: Espera máxima en cola (por defecto ADMISSION_MAX_WAIT o 30)
+        """
+        self.max_concurrent = max_concurrent or int(os.getenv("ADMISSION_MAX_CONCURRENT", "16"))
+        self.per_user_concurrency = per_user_concurrency or int(os.getenv("ADMISSION_USER_CONCURRENCY", "2"))
+        self.per_user_rpm = per_user_rpm if per_user_rpm is not None else float(os.getenv("ADMISSION_USER_RPM", "20"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+        self.per_user_queue = per_user_queue if per_user_queue is not None else int(os.getenv("ADMISSION_USER_QUEUE", "4"))
+        self.max_wait_seconds = max_wait_seconds or float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+
+        self._limiter = FairLimiter(self.max_concurrent, max_per_key=self.per_user_concurrency)
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        # Media móvil de la duración de las peticiones, para estimar el Retry-After
+        self._average_seconds = 10.0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def admit(self, key: Hashable) -> AdmissionTicket:
+        """
+        Espera turno para el usuario ``key``
+
+        Raises:
+            AdmissionRejected: límite de ritmo superado, cola llena o espera agotada
+        """
+        bucket = self._bucket(key)
+        if bucket is not None:
+            wait = bucket.wait_time(1)
+            if wait > 0:
+                self._reject("rate", wait)
+
+        if self._limiter.would_wait(key) and (
+            self._limiter.waiting >= self.max_queue or self._limiter.waiting_for(key) >= self.per_user_queue
+        ):
+            self._reject("queue", self._estimated_wait())
+
+        # Sin await entre las comprobaciones y el acquire: la petición entra en la
+        # cola antes de ceder el control, así que una ráfaga ve la cola real
+        if bucket is not None:
+            bucket.consume(1)
+        try:
+            async with asyncio.timeout(self.max_wait_seconds):
+                await self._limiter.acquire(key)
+        except TimeoutError:
+            # Una petición rechazada no gasta cupo de ritmo
+            if bucket is not None:
+                bucket.refund(1)
+            self._reject("timeout", self._estimated_wait())
+
+        self.admitted += 1
+        return AdmissionTicket(self, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self._limiter.in_flight,
+            "waiting": self._limiter.waiting,
+            "users_tracked": len(self._buckets),
+            "average_seconds": round(self._average_seconds, 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+    def _release(self, ticket: AdmissionTicket):
+        elapsed = time.monotonic() - ticket.admitted_at
+        self._average_seconds = 0.8 * self._average_seconds + 0.2 * elapsed
+        self._limiter.release(ticket.key)
+
+    def _bucket(self, key: Hashable) -> Optional[TokenBucket]:
+        if self.per_user_rpm <= 0:
+            return None
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= 10000:
+                # Los cubos llenos equivalen a uno nuevo: se pueden olvidar
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.is_full}
+            bucket = self._buckets[key] = TokenBucket(self.per_user_rpm)
+        return bucket
+
+    def _estimated_wait(self) -> float:
+        # Cuánto tardaría en vaciarse la cola actual con el ritmo medio de servicio
+        return self._average_seconds * (self._limiter.waiting + 1) / self.max_concurrent
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected += 1
+        ADMISSION_REJECTED.labels(reason).inc()
+        raise AdmissionRejected(reason, retry_after)
@@ -0,0 +1,200 @@
+# utils/services/background_jobs.py
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from utils.services import tracing
+from utils.services.job_store import CANCELLED, COMPLETED, FAILED, RUNNING, JobStore, LeaseLost, SQLiteJobStore
+
+
+class JobHandler(ABC):
+    """
+    Ejecuta un tipo de trabajo en dos fases: generar filas y guardarlas fuera
+
+    Entre ambas el worker anota el lote en el ``JobStore``; si la instancia muere
+    o pierde el trabajo a mitad de un guardado, la siguiente ejecución llama a
+    ``save`` con ``recovering=True`` para ese lote en vez de generarlo otra vez.
+    """
+
+    @abstractmethod
+    def generate(self, params: Dict[str, Any], remaining: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Recibe los parámetros guardados y cuántos resultados faltan; entrega lotes de filas sin guardar"""
+
+    @abstractmethod
+    async def save(self, params: Dict[str, Any], rows: List[Dict[str, Any]], recovering: bool = False) -> List[Dict[str, Any]]:
+        """
+        Guarda un lote y devuelve las filas guardadas (con sus ids)
+
+        Con ``recovering=True`` el lote pudo guardarse ya en una ejecución anterior:
+        debe reutilizar lo que exista y guardar solo lo que falte.
+        """
+
+
+class BackgroundJobs:
+    """
+    Pool de workers que ejecuta trabajos largos fuera de la petición HTTP
+
+    Los trabajos se encolan en un ``JobStore`` y cada worker toma el más antiguo.
+    Los resultados se guardan según llegan, así que se pueden consultar parciales.
+    Un worker renueva el latido de su trabajo mientras lo ejecuta: si la instancia
+    muere, al vencer el plazo el trabajo vuelve a la cola y se reanuda pidiendo
+    solo los resultados que faltaban.
+    """
+
+    def __init__(
+        self,
+        store: Optional[JobStore] = None,
+        workers: Optional[int] = None,
+        lease_seconds: Optional[float] = None,
+        poll_seconds: Optional[float] = None,
+        retention_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            store: Persistencia de los trabajos (por defecto SQLiteJobStore)
+            workers: Trabajos ejecutándose a la vez (por defecto JOB_WORKERS o 2)
+            lease_seconds: Sin latido durante este tiempo, un trabajo en curso se
+                reencola (por defecto JOB_LEASE_SECONDS o 60)
+            poll_seconds: Cada cuánto mira la cola un worker ocioso (por defecto JOB_POLL_SECONDS o 5)
+            retention_seconds: Tiempo que se conservan los trabajos terminados
+                (por defecto JOB_RETENTION_SECONDS o 86400)
+        """
+        self.store = store or SQLiteJobStore()
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.lease_seconds = lease_seconds or float(os.getenv("JOB_LEASE_SECONDS", "60"))
+        self.poll_seconds = poll_seconds or float(os.getenv("JOB_POLL_SECONDS", "5"))
+        self.retention_seconds = retention_seconds or float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+        self._handler: Optional[JobHandler] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        # Trabajos ejecutándose en esta instancia, los que se están cancelando y
+        # los que otra instancia ha retomado (se abandonan sin escribir nada)
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelling: Set[str] = set()
+        self._lost: Set[str] = set()
+
+    async def start(self, handler: JobHandler):
+        """Arranca los workers; ``handler`` ejecuta cada trabajo"""
+        self._handler = handler
+        pruned = await self.store.prune(self.retention_seconds)
+        if pruned:
+            print(f"🧹 {pruned} trabajos antiguos eliminados")
+        await self._requeue_stale()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, owner: str, params: Dict[str, Any], requested: int) -> Dict[str, Any]:
+        """Encola un trabajo y despierta a un worker"""
+        job = await self.store.create(owner, params, requested)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(job_id)
+
+    async def results(self, job_id: str, offset: int = 0) -> List[Dict[str, Any]]:
+        """Resultados (parciales o finales) del trabajo a partir de ``offset``"""
+        return await self.store.results(job_id, offset)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancela un trabajo. Si otra instancia lo está ejecutando, lo detiene
+        en su siguiente latido.
+        """
+        job = await self.store.request_cancel(job_id)
+        self._cancel_local(job_id)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "running": sorted(self._running)}
+
+    async def aclose(self):
+        """Detiene los workers; los trabajos a medias vuelven a la cola"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.store.close()
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            job = await self.store.claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    await self._requeue_stale()
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id, lease = job["id"], job["lease"]
+        self._running[job_id] = asyncio.current_task()
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, lease))
+        try:
+            with tracing.span("job", job_id=job_id) as span:
+                # Lotes que una ejecución anterior dejó a medio guardar
+                for batch_id, rows in await self.store.pending_results(job_id):
+                    saved = await self._handler.save(job["params"], rows, recovering=True)
+                    await self.store.commit_results(job_id, lease, batch_id, saved)
+                    print(f"🩹 Trabajo {job_id}: lote pendiente conciliado ({len(saved)} filas)")
+
+                # Un trabajo reanudado solo pide lo que faltaba
+                job = await self.store.get(job_id)
+                remaining = job["requested"] - job["produced"]
+                span.set(requested=remaining)
+                print(f"🧵 Trabajo {job_id}: {remaining}/{job['requested']} resultados pendientes")
+                if remaining > 0:
+                    async for rows in self._handler.generate(job["params"], remaining):
+                        if rows:
+                            batch_id = await self.store.stage_results(job_id, lease, rows)
+                            saved = await self._handler.save(job["params"], rows)
+                            await self.store.commit_results(job_id, lease, batch_id, saved)
+            await self.store.finish(job_id, lease, COMPLETED)
+        except LeaseLost:
+            print(f"⚠️ Trabajo {job_id} retomado por otra ejecución; se abandona")
+        except asyncio.CancelledError:
+            if job_id in self._lost:
+                asyncio.current_task().uncancel()
+                print(f"⚠️ Trabajo {job_id} retomado por otra ejecución; se abandona")
+            elif job_id not in self._cancelling:
+                # Apagado de la instancia: otra ejecución lo retomará
+                await self.store.requeue(job_id, lease)
+                raise
+            else:
+                asyncio.current_task().uncancel()
+                await self.store.finish(job_id, lease, CANCELLED)
+                print(f"🛑 Trabajo {job_id} cancelado")
+        except Exception as e:
+            print(f"❌ Trabajo {job_id} fallido: {e}")
+            await self.store.finish(job_id, lease, FAILED, str(e))
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+            self._cancelling.discard(job_id)
+            self._lost.discard(job_id)
+
+    async def _heartbeat(self, job_id: str, lease: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.store.heartbeat(job_id, lease):
+                self._cancel_local(job_id, lost=True)
+                return
+            job = await self.store.get(job_id)
+            if job is None or job["cancel_requested"] or job["status"] != RUNNING:
+                self._cancel_local(job_id)
+                return
+
+    def _cancel_local(self, job_id: str, lost: bool = False):
+        task = self._running.get(job_id)
+        if task is not None and job_id not in self._cancelling and job_id not in self._lost:
+            (self._lost if lost else self._cancelling).add(job_id)
+            task.cancel()
+
+    async def _requeue_stale(self):
+        requeued = await self.store.requeue_stale(self.lease_seconds)
+        if requeued:
+            print(f"♻️ {requeued} trabajos interrumpidos vuelven a la cola")
+            self._wakeup.set()
@@ -0,0 +1,153 @@
+# utils/services/client_registry.py
+import asyncio
+import importlib
+import os
+import time
+from typing import Optional
+
+import httpx
+import openai
+from dotenv import load_dotenv, find_dotenv
+from fastapi import Request
+
+from utils.repository.agent_repository import AgentRepository
+from utils.repository.openai_repository import OpenAIRepository
+from utils.repository.question_repository import QuestionRepository
+from utils.repository.rag_respository import RAGRepository
+from utils.repository.async_supabase_repository import AsyncSupabaseRepository
+from utils.services.admission import AdmissionController
+from utils.services.background_jobs import BackgroundJobs
+from utils.services.embedding_cache import EmbeddingCache
+from utils.services.embedding_service import EmbeddingService
+from utils.services.llm_scheduler import LLMScheduler
+from utils.services.prompt_cache import PromptCache
+from utils.services.retrieval_cache import RetrievalCache
+from utils.services.vector_search import VectorSearchService
+from utils.tools.text_utils import load_encoding
+
+# Dependencias pesadas que se importan en segundo plano tras arrancar
+WARMUP_MODULES = ("agents", "supabase")
+
+
+class ClientRegistry:
+    """
+    Registro de clientes de larga duración (OpenAI, Supabase, RAG y agentes)
+
+    Se crea una única vez en el lifespan de ``main.app`` y se inyecta en las rutas
+    con ``Depends(get_registry)``, de modo que las conexiones HTTP (y sus handshakes
+    TLS) se reutilizan entre peticiones.
+    """
+
+    def __init__(
+        self,
+        embedding_provider: str = "openai",
+        embedding_model: Optional[str] = "text-embedding-3-large",
+        max_connections: Optional[int] = None
+    ):
+        """
+        Args:
+            embedding_provider: Proveedor de embeddings para el RAG
+            embedding_model: Modelo de embeddings para el RAG
+            max_connections: Tamaño del pool HTTP hacia OpenAI
+                (por defecto OPENAI_MAX_CONNECTIONS o 100)
+        """
+        # El .env solo se lee una vez por proceso
+        load_dotenv(find_dotenv())
+
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("Missing OPENAI_API_KEY")
+
+        max_connections = max_connections or int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+
+        # Cliente asíncrono compartido por embeddings y por el SDK de agentes
+        self.openai_async = openai.AsyncOpenAI(
+            api_key=api_key,
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections
+                )
+            )
+        )
+
+        # Un cliente por esquema de Postgres
+        self.supabase = AsyncSupabaseRepository()
+        self.law_frame = AsyncSupabaseRepository(schema="law_frame")
+
+        # Prompts de sistema y agentes cacheados para todo el proceso
+        self.prompt_cache = PromptCache(self.supabase)
+        self.agent_repo = AgentRepository(supabase=self.supabase, prompt_cache=self.prompt_cache)
+        # Concurrencia y presupuestos TPM/RPM compartidos por todas las peticiones
+        # Admisión por usuario delante de los endpoints autenticados
+        self.admission = AdmissionController()
+        # El cliente se registra en el SDK de agentes en la primera ejecución
+        self.llm_scheduler = LLMScheduler(openai_client=self.openai_async)
+        self.question_repo = QuestionRepository(
+            agent_repo=self.agent_repo, supabase=self.supabase, scheduler=self.llm_scheduler
+        )
+        self.openai = OpenAIRepository(question_repo=self.question_repo)
+
+        # Caché de embeddings de consultas (memoria + disco)
+        self.embedding_cache = EmbeddingCache()
+        self.rag = RAGRepository(
+            embedding_service=EmbeddingService(
+                provider=embedding_provider,
+                model_name=embedding_model,
+                client=self.openai_async if embedding_provider == "openai" else None,
+                cache=self.embedding_cache
+            ),
+            vector_search=VectorSearchService(supabase=self.law_frame),
+            retrieval_cache=RetrievalCache()
+        )
+        # Trabajos de generación en segundo plano (los workers arrancan en el lifespan)
+        self.jobs = BackgroundJobs()
+        self._background: list[asyncio.Task] = []
+
+    async def start(self):
+        """
+        Arranca las tareas de fondo del registro
+
+        El tokenizador se carga antes de aceptar peticiones, en un hilo, para que
+        ningún conteo de tokens lo descargue dentro del event loop. El índice
+        vectorial local se carga en segundo plano; hasta que esté listo las
+        búsquedas usan la RPC de Supabase. Las dependencias pesadas se precargan
+        también en segundo plano (WARMUP=0 lo desactiva).
+        """
+        await asyncio.to_thread(load_encoding)
+        if os.getenv("WARMUP", "1") != "0":
+            self._background.append(asyncio.create_task(asyncio.to_thread(self._warmup)))
+        if self.rag.vector_search.local_index is not None:
+            self._background.append(asyncio.create_task(self._load_local_index()))
+
+    @staticmethod
+    def _warmup():
+        started = time.perf_counter()
+        for module in WARMUP_MODULES:
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                print(f"⚠️ No se pudo precargar {module}: {e}")
+        print(f"🔥 Precarga completada en {time.perf_counter() - started:.2f}s")
+
+    async def _load_local_index(self):
+        try:
+            await self.rag.vector_search.load_local_index()
+        except Exception as e:
+            print(f"❌ Error cargando el índice vectorial local, se usará la RPC: {e}")
+
+    async def aclose(self):
+        """Cierra los pools HTTP al apagar la aplicación"""
+        for task in self._background:
+            task.cancel()
+        await self.jobs.aclose()
+        await self.openai_async.close()
+        self.openai.client.close()
+        await self.supabase.aclose()
+        await self.law_frame.aclose()
+        self.embedding_cache.close()
+
+
+def get_registry(request: Request) -> ClientRegistry:
+    """Dependency que devuelve el registro creado en el lifespan de la app"""
+    return request.app.state.clients
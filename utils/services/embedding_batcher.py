@@ -0,0 +1,86 @@
+# utils/services/embedding_batcher.py
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class EmbeddingBatcher:
+    """
+    Agrupa llamadas concurrentes de un solo texto en una única llamada batch
+
+    Las peticiones se acumulan durante ``max_wait_ms`` milisegundos o hasta
+    ``max_batch_size`` textos; después se envían juntas y cada llamante recibe
+    su vector. Los textos repetidos dentro de un mismo lote se envían una vez.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Args:
+            batch_fn: Función asíncrona que genera embeddings para una lista de textos
+            max_batch_size: Textos máximos por lote
+            max_wait_ms: Tiempo máximo que espera el primer texto de un lote
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Referencias a los lotes en curso para que no los recoja el GC
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, text: str) -> List[float]:
+        """Encola un texto y espera a que su lote se resuelva"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Deduplicar textos idénticos dentro del lote
+        positions: Dict[str, int] = {}
+        for text, _ in batch:
+            positions.setdefault(text, len(positions))
+
+        try:
+            unique_texts = list(positions)
+            vectors = await self.batch_fn(unique_texts)
+            if vectors is None or len(vectors) != len(unique_texts):
+                raise ValueError(
+                    f"batch_fn devolvió {len(vectors) if vectors is not None else 0} vectores "
+                    f"para {len(unique_texts)} textos"
+                )
+
+            for text, future in batch:
+                # El llamante puede haber cancelado mientras esperaba
+                if not future.done():
+                    future.set_result(vectors[positions[text]])
+        except Exception as e:
+            # Ningún llamante puede quedarse esperando un lote que ha fallado
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
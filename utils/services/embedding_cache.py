@@ -0,0 +1,168 @@
+# utils/services/embedding_cache.py
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Caché de embeddings en dos niveles: LRU en memoria respaldada por SQLite en disco
+
+    Los vectores se guardan como float32 contiguos (4 bytes por dimensión), o
+    float16 (2 bytes) para ocupar la mitad, y la clave es un hash de
+    (proveedor, modelo, texto normalizado).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_entries: Optional[int] = None,
+        max_disk_entries: Optional[int] = None,
+        dtype: Optional[str] = None
+    ):
+        """
+        Args:
+            path: Fichero SQLite (por defecto EMBEDDING_CACHE_PATH o
+                ".cache/embeddings.sqlite3"). Una cadena vacía desactiva el disco.
+            max_memory_entries: Vectores en memoria (por defecto
+                EMBEDDING_CACHE_MEMORY_ENTRIES o 2048)
+            max_disk_entries: Vectores en disco (por defecto
+                EMBEDDING_CACHE_DISK_ENTRIES o 20000)
+            dtype: "float32" o "float16" (por defecto EMBEDDING_CACHE_DTYPE o "float32")
+        """
+        if path is None:
+            path = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+        self.max_memory_entries = max_memory_entries or int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "2048"))
+        self.max_disk_entries = max_disk_entries or int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "20000"))
+        self.dtype = np.dtype(dtype or os.getenv("EMBEDDING_CACHE_DTYPE", "float32"))
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Tipo de la caché de embeddings no soportado: {self.dtype}")
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if path:
+            self._open_disk(path)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normaliza Unicode (NFC) y espacios para que variaciones triviales compartan clave"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def make_key(self, provider: str, model: str, text: str) -> str:
+        raw = f"{provider}\x1f{model}\x1f{self.normalize(text)}"
+        # Las entradas float16 no comparten clave con las float32 ya guardadas
+        if self.dtype != np.float32:
+            raw += f"\x1f{self.dtype.name}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[np.ndarray]:
+        """Busca un vector primero en memoria y después en disco"""
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+
+        if self._db is not None:
+            vector = await asyncio.to_thread(self._disk_get, key)
+            if vector is not None:
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, vector: Union[List[float], np.ndarray]):
+        """Guarda un vector en ambos niveles"""
+        vector = np.ascontiguousarray(vector, dtype=self.dtype)
+        self._remember(key, vector)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, vector)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Contadores de aciertos/fallos y ocupación de cada nivel"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": self._disk_count() if self._db is not None else 0,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+    # 🔹 Nivel en memoria
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    # 🔹 Nivel en disco
+
+    def _open_disk(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings(last_access)")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Caché de embeddings en disco desactivada ({path}): {e}")
+            self._db = None
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        with self._db_lock:
+            row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE embeddings SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return np.frombuffer(row[0], dtype=self.dtype)
+
+    def _disk_put(self, key: str, vector: np.ndarray):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                (key, vector.tobytes(), time.time())
+            )
+            # Expulsa los menos usados recientemente si se supera el límite
+            overflow = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_disk_entries
+            if overflow > 0:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+            self._db.commit()
+
+    def _disk_count(self) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
@@ -1,37 +1,92 @@
 # utils/rag/embedding_service.py
 import asyncio
 import openai
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import os
 
+from utils.services.embedding_batcher import EmbeddingBatcher
+from utils.services.embedding_cache import EmbeddingCache
+from utils.services.local_embedding_models import get_encode_executor, get_sentence_transformer
+from utils.services import tracing
+from utils.tools.retry import retry_async
+from utils.tools.text_utils import count_tokens
+from utils.tools.vector_utils import cosine_similarity, top_k_similar
+
+# Errores de OpenAI que merece la pena reintentar tal cual (el resto se trata dividiendo el lote)
+_TRANSIENT_OPENAI_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
 class EmbeddingService:
     """
     Servicio para generar embeddings de texto usando diferentes proveedores
     """
     
-    def __init__(self, provider: str = "openai", model_name: Optional[str] = None):
+    def __init__(
+        self,
+        provider: str = "openai",
+        model_name: Optional[str] = None,
+        client: Optional[openai.AsyncOpenAI] = None,
+        cache: Optional[EmbeddingCache] = None,
+        batch_max_size: Optional[int] = None,
+        batch_max_wait_ms: Optional[float] = None,
+        dimensions: Optional[int] = None
+    ):
         """
         Inicializa el servicio de embeddings
         
         Args:
             provider: "openai", "huggingface", o "sentence_transformers"
             model_name: Nombre específico del modelo a usar
+            client: Cliente AsyncOpenAI compartido (solo provider "openai").
+                Si no se indica, se crea uno nuevo.
+            cache: Caché de embeddings de consultas (opcional)
+            batch_max_size: Textos máximos que agrupa el micro-batcher
+                (por defecto EMBEDDING_BATCH_MAX_SIZE o 64)
+            batch_max_wait_ms: Espera máxima para completar un lote
+                (por defecto EMBEDDING_BATCH_MAX_WAIT_MS o 5). Con 0 se desactiva.
+            dimensions: Recorte Matryoshka de la API de OpenAI (modelos text-embedding-3;
+                por defecto EMBEDDING_DIMENSIONS o 0 = tamaño completo). Los vectores
+                de law_items deben tener las mismas dimensiones que las consultas.
         """
         self.provider = provider.lower()
+        self.cache = cache
+
+        if batch_max_size is None:
+            batch_max_size = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+        if batch_max_wait_ms is None:
+            batch_max_wait_ms = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+        # Agrupa llamadas concurrentes de generate_embedding en una sola petición
+        self.batcher = (
+            EmbeddingBatcher(self.generate_embeddings_batch, batch_max_size, batch_max_wait_ms)
+            if batch_max_size > 1 and batch_max_wait_ms > 0 else None
+        )
         
+        self.dimensions = dimensions or int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+        if self.dimensions and self.provider != "openai":
+            raise ValueError("El parámetro dimensions solo está disponible con el proveedor openai")
+
         if self.provider == "openai":
             self.model_name = model_name or "text-embedding-3-large"
-            self.client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            self.client = client or openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            # Lotes por tokens (límite por petición de la API) y peticiones simultáneas
+            self.max_batch_tokens = int(os.getenv("EMBEDDING_REQUEST_MAX_TOKENS", "250000"))
+            self.max_batch_items = int(os.getenv("EMBEDDING_REQUEST_MAX_ITEMS", "2048"))
+            self.max_attempts = int(os.getenv("EMBEDDING_REQUEST_MAX_ATTEMPTS", "4"))
+            self._request_slots = asyncio.Semaphore(int(os.getenv("EMBEDDING_REQUEST_CONCURRENCY", "4")))
             
         elif self.provider == "sentence_transformers":
             self.model_name = model_name or "all-MiniLM-L6-v2"
-            # Cargar modelo localmente
-            self.model = SentenceTransformer(self.model_name)
+            # Modelo local compartido por todo el proceso (solo se carga la primera vez)
+            self.model = get_sentence_transformer(self.model_name)
             
         else:
             raise ValueError(f"Proveedor no soportado: {provider}")
+
+    @property
+    def model_key(self) -> str:
+        """Identifica los vectores que produce el servicio (modelo y dimensiones) para cachés y checkpoints"""
+        return f"{self.model_name}@{self.dimensions}" if self.dimensions else self.model_name
     
     async def generate_embedding(self, text: str) -> List[float]:
         """
@@ -44,10 +99,25 @@ class EmbeddingService:
             Lista de floats representando el embedding
         """
         try:
-            if self.provider == "openai":
-                return await self._generate_openai_embedding(text)
-            elif self.provider == "sentence_transformers":
-                return await self._generate_sentence_transformer_embedding(text)
+            with tracing.span("embedding", provider=self.provider) as current:
+                if self.cache is not None:
+                    key = self.cache.make_key(self.provider, self.model_key, text)
+                    cached = await self.cache.get(key)
+                    if cached is not None:
+                        current.set(cached=True)
+                        return cached.tolist()
+
+                current.set(cached=False, input_tokens=count_tokens(text))
+                if self.batcher is not None:
+                    embedding = await self.batcher.submit(text)
+                elif self.provider == "openai":
+                    embedding = await self._generate_openai_embedding(text)
+                elif self.provider == "sentence_transformers":
+                    embedding = await self._generate_sentence_transformer_embedding(text)
+
+                if self.cache is not None:
+                    await self.cache.put(key, embedding)
+                return embedding
         except Exception as e:
             print(f"❌ Error generando embedding: {e}")
             raise
@@ -75,43 +145,84 @@ class EmbeddingService:
         """Genera embedding usando OpenAI"""
         response = await self.client.embeddings.create(
             input=text,
-            model=self.model_name
+            model=self.model_name,
+            **self._dimensions_kwargs()
         )
         return response.data[0].embedding
     
     async def _generate_openai_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Genera embeddings en batch usando OpenAI"""
-        # OpenAI permite hasta 2048 textos por batch
-        batch_size = 2048
-        all_embeddings = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            response = await self.client.embeddings.create(
-                input=batch_texts,
-                model=self.model_name
+        """
+        Genera embeddings en batch usando OpenAI
+
+        Los textos se agrupan en lotes por número estimado de tokens (y de
+        elementos), que se envían en paralelo hasta EMBEDDING_REQUEST_CONCURRENCY
+        peticiones. El resultado conserva el orden de entrada.
+        """
+        batches = await asyncio.gather(*[
+            self._embed_openai_sub_batch(texts[start:end]) for start, end in self._token_batches(texts)
+        ])
+        return [embedding for batch in batches for embedding in batch]
+
+    def _token_batches(self, texts: List[str]) -> Iterator[Tuple[int, int]]:
+        """Rangos [inicio, fin) consecutivos que respetan los límites de tokens y elementos por petición"""
+        start, tokens = 0, 0
+        for i, text in enumerate(texts):
+            text_tokens = count_tokens(text)
+            if i > start and (tokens + text_tokens > self.max_batch_tokens or i - start >= self.max_batch_items):
+                yield start, i
+                start, tokens = i, 0
+            tokens += text_tokens
+        if start < len(texts):
+            yield start, len(texts)
+
+    async def _embed_openai_sub_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Una petición de embeddings con reintentos solo para este lote
+
+        Los errores transitorios (429, conexión, 5xx) se reintentan con backoff; si la
+        API rechaza el lote (p. ej. un texto demasiado largo), se divide en dos para
+        aislar el texto problemático sin repetir el resto.
+        """
+        async def request() -> List[List[float]]:
+            async with self._request_slots:
+                with tracing.span("embedding_request", items=len(texts)) as current:
+                    response = await self.client.embeddings.create(
+                        input=texts, model=self.model_name, **self._dimensions_kwargs()
+                    )
+                    if response.usage is not None:
+                        current.set(input_tokens=response.usage.prompt_tokens)
+            return [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+
+        try:
+            return await retry_async(
+                request, max_attempts=self.max_attempts,
+                retry_on=_TRANSIENT_OPENAI_ERRORS, label=f"Lote de {len(texts)} embeddings"
             )
-            batch_embeddings = [data.embedding for data in response.data]
-            all_embeddings.extend(batch_embeddings)
-        
-        return all_embeddings
+        except openai.BadRequestError:
+            if len(texts) == 1:
+                raise
+            middle = len(texts) // 2
+            left, right = await asyncio.gather(
+                self._embed_openai_sub_batch(texts[:middle]),
+                self._embed_openai_sub_batch(texts[middle:])
+            )
+            return left + right
     
+    def _dimensions_kwargs(self) -> dict:
+        # Sin recorte no se envía el parámetro (ada-002 no lo admite)
+        return {"dimensions": self.dimensions} if self.dimensions else {}
+
     async def _generate_sentence_transformer_embedding(self, text: str) -> List[float]:
         """Genera embedding usando Sentence Transformers"""
-        # Ejecutar en un hilo separado para no bloquear el event loop
-        loop = asyncio.get_event_loop()
-        embedding = await loop.run_in_executor(
-            None, 
-            lambda: self.model.encode([text])[0].tolist()
-        )
-        return embedding
+        return (await self._generate_sentence_transformer_embeddings_batch([text]))[0]
     
     async def _generate_sentence_transformer_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Genera embeddings en batch usando Sentence Transformers"""
-        loop = asyncio.get_event_loop()
+        # Pool propio y acotado: la inferencia en CPU no bloquea el event loop ni el pool por defecto
+        loop = asyncio.get_running_loop()
         embeddings = await loop.run_in_executor(
-            None,
-            lambda: self.model.encode(texts).tolist()
+            get_encode_executor(),
+            lambda: self.model.encode(texts, convert_to_numpy=True).tolist()
         )
         return embeddings
     
@@ -119,6 +230,8 @@ class EmbeddingService:
         """
         Retorna la dimensión del embedding según el modelo usado
         """
+        if self.dimensions:
+            return self.dimensions
         dimensions = {
             "text-embedding-3-small": 1536,
             "text-embedding-3-large": 3072,
@@ -133,15 +246,33 @@ class EmbeddingService:
     def calculate_cosine_similarity(embedding1: List[float], embedding2: List[float]) -> float:
         """
         Calcula la similitud coseno entre dos embeddings
+
+        Para comparar muchos vectores usar ``find_most_similar`` (una sola llamada BLAS).
         """
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
-        
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return dot_product / (norm1 * norm2)
\ No newline at end of file
+        return cosine_similarity(embedding1, embedding2)
+
+    @staticmethod
+    def find_most_similar(
+        query_embeddings,
+        candidate_embeddings,
+        k: int = 10,
+        candidates_normalized: bool = False,
+        chunk_size: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k por similitud coseno de una o varias consultas contra una matriz de candidatos
+
+        Args:
+            query_embeddings: Un embedding o una lista/matriz de embeddings
+            candidate_embeddings: Matriz (n, d) de candidatos
+            k: Resultados por consulta
+            candidates_normalized: True si los candidatos ya son float32 normalizados
+            chunk_size: Candidatos por bloque para acotar la memoria
+
+        Returns:
+            Tupla ``(indices, scores)`` ordenada de mayor a menor similitud
+        """
+        return top_k_similar(
+            query_embeddings, candidate_embeddings, k,
+            candidates_normalized=candidates_normalized, chunk_size=chunk_size
+        )
\ No newline at end of file
@@ -0,0 +1,234 @@
+# utils/services/ingestion.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set
+
+from utils.repository.async_supabase_repository import AsyncSupabaseRepository
+from utils.services.embedding_service import EmbeddingService
+from utils.tools.text_utils import iter_chunks
+
+# Extensiones que se leen al ingerir un directorio
+TEXT_EXTENSIONS = {".txt", ".md"}
+
+
+class SourceDocument(NamedTuple):
+    source_id: str
+    content: str
+    title: Optional[str] = None
+
+
+def iter_source_documents(path: str) -> Iterator[SourceDocument]:
+    """
+    Lee documentos de uno en uno desde un fichero JSONL o un directorio
+
+    - JSONL: una línea por documento con ``content`` y ``source_id`` (o ``id``);
+      ``title`` es opcional.
+    - Directorio: cada fichero .txt/.md es un documento cuyo source_id es su ruta relativa.
+    """
+    root = Path(path)
+    if root.is_dir():
+        for file in sorted(root.rglob("*")):
+            if file.is_file() and file.suffix.lower() in TEXT_EXTENSIONS:
+                yield SourceDocument(file.relative_to(root).as_posix(), file.read_text(encoding="utf-8"), file.stem)
+        return
+
+    with root.open(encoding="utf-8") as lines:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            source_id = item.get("source_id") or item.get("id")
+            if source_id is None or not item.get("content"):
+                print(f"⚠️ Línea {number} sin source_id/id o sin content, se omite")
+                continue
+            yield SourceDocument(str(source_id), item["content"], item.get("title"))
+
+
+def content_hash(document: SourceDocument, max_tokens: int, model_name: str) -> str:
+    """Hash del contenido y de lo que determina sus chunks/vectores (cambiarlos obliga a reingerir)"""
+    raw = f"{model_name}\x1f{max_tokens}\x1f{document.title or ''}\x1f{document.content}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IngestionCheckpoint:
+    """
+    Registro local (SQLite) de los documentos ya ingeridos y su hash
+
+    Un documento solo se marca cuando todos sus chunks se han escrito, así que
+    tras una caída se reanuda por los que faltaban y los que no han cambiado se saltan.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "source_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, "
+            "chunks INTEGER NOT NULL, ingested_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, source_id: str) -> Optional[tuple]:
+        """(hash, número de chunks) de la última ingesta del documento, o None"""
+        return self._db.execute(
+            "SELECT content_hash, chunks FROM documents WHERE source_id = ?", (source_id,)
+        ).fetchone()
+
+    def mark(self, entries: Iterable[tuple]):
+        """Marca como ingeridos varios (source_id, hash, chunks) en una sola transacción"""
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO documents (source_id, content_hash, chunks, ingested_at) VALUES (?, ?, ?, ?)",
+            [(source_id, digest, chunks, now) for source_id, digest, chunks in entries]
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class _PendingDocument(NamedTuple):
+    source_id: str
+    digest: str
+    chunks: List[str]
+    previous_chunks: int
+    title: Optional[str]
+
+
+class IngestionPipeline:
+    """
+    Ingesta masiva de documentos en ``law_items``: chunkeo → embeddings por lotes → upsert
+
+    Cada fila es un chunk identificado por (source_id, chunk_index), que debe
+    tener una restricción UNIQUE en la tabla para que el upsert sea idempotente.
+    Los lotes de embeddings se procesan con concurrencia acotada y los
+    documentos se registran en el checkpoint cuando su lote se ha escrito.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        supabase: Optional[AsyncSupabaseRepository] = None,
+        checkpoint: Optional[IngestionCheckpoint] = None,
+        table_name: str = "law_items",
+        max_tokens: int = 500,
+        batch_size: int = 256,
+        concurrency: int = 4,
+        force: bool = False
+    ):
+        """
+        Args:
+            embedding_service: Servicio con el que se calculan los vectores
+            supabase: Repositorio del esquema "law_frame"
+            checkpoint: Registro de progreso (por defecto .cache/ingestion.sqlite3)
+            table_name: Tabla destino
+            max_tokens: Tamaño máximo de cada chunk
+            batch_size: Chunks por petición de embeddings y por upsert
+            concurrency: Lotes procesándose a la vez
+            force: Reingerir aunque el hash no haya cambiado
+        """
+        self.embedding_service = embedding_service
+        self.supabase = supabase or AsyncSupabaseRepository(schema="law_frame")
+        self.checkpoint = checkpoint or IngestionCheckpoint(".cache/ingestion.sqlite3")
+        self.table_name = table_name
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.force = force
+        self.stats: Dict[str, int] = {"documents": 0, "skipped": 0, "ingested": 0, "chunks": 0, "failed": 0}
+
+    async def run(self, documents: Iterable[SourceDocument]) -> Dict[str, int]:
+        """Ingiere los documentos en streaming; devuelve contadores de la ejecución"""
+        started = time.perf_counter()
+        in_flight: Set[asyncio.Task] = set()
+        batch: List[_PendingDocument] = []
+        batch_chunks = 0
+
+        for document in documents:
+            self.stats["documents"] += 1
+            pending = self._prepare(document)
+            if pending is None:
+                self.stats["skipped"] += 1
+                continue
+
+            batch.append(pending)
+            batch_chunks += len(pending.chunks)
+            if batch_chunks >= self.batch_size:
+                await self._submit(batch, in_flight)
+                batch, batch_chunks = [], 0
+
+        if batch:
+            await self._submit(batch, in_flight)
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+        print(f"🏁 Ingesta terminada en {time.perf_counter() - started:.1f}s: {self.stats}")
+        return self.stats
+
+    def _prepare(self, document: SourceDocument) -> Optional[_PendingDocument]:
+        digest = content_hash(document, self.max_tokens, self.embedding_service.model_key)
+        previous = self.checkpoint.get(document.source_id)
+        if previous and previous[0] == digest and not self.force:
+            return None
+
+        chunks = list(iter_chunks(document.content, self.max_tokens))
+        return _PendingDocument(document.source_id, digest, chunks, previous[1] if previous else 0, document.title)
+
+    async def _submit(self, batch: List[_PendingDocument], in_flight: Set[asyncio.Task]):
+        # Concurrencia acotada: no se lee más entrada hasta que hay hueco
+        while len(in_flight) >= self.concurrency:
+            await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        task = asyncio.create_task(self._process(batch))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    async def _process(self, batch: List[_PendingDocument]):
+        texts = [chunk for document in batch for chunk in document.chunks]
+        try:
+            vectors = await self.embedding_service.generate_embeddings_batch(texts) if texts else []
+
+            rows: List[Dict[str, Any]] = []
+            position = 0
+            for document in batch:
+                for index, chunk in enumerate(document.chunks):
+                    rows.append({
+                        "source_id": document.source_id,
+                        "chunk_index": index,
+                        "title": document.title,
+                        "content": chunk,
+                        "content_hash": document.digest,
+                        "embedding": vectors[position],
+                    })
+                    position += 1
+
+            if rows:
+                result = await self.supabase.upsert_many(self.table_name, rows, on_conflict="source_id,chunk_index")
+                if result["errors"]:
+                    raise RuntimeError(f"{len(result['errors'])} bloques de upsert fallidos: {result['errors'][0]['error']}")
+
+            await self._delete_stale_chunks(batch)
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            print(f"❌ Lote de {len(batch)} documentos fallido (se reintentará en la próxima ejecución): {e}")
+            return
+
+        self.checkpoint.mark((document.source_id, document.digest, len(document.chunks)) for document in batch)
+        self.stats["ingested"] += len(batch)
+        self.stats["chunks"] += len(texts)
+        print(f"✅ {self.stats['ingested']} documentos ingeridos ({self.stats['chunks']} chunks)")
+
+    async def _delete_stale_chunks(self, batch: List[_PendingDocument]):
+        # Si un documento ahora tiene menos chunks, sus chunks finales antiguos sobran
+        for document in batch:
+            for index in range(len(document.chunks), document.previous_chunks):
+                await self.supabase.delete(
+                    self.table_name, {"source_id": document.source_id, "chunk_index": index}
+                )
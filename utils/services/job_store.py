@@ -0,0 +1,333 @@
+# utils/services/job_store.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from utils.tools.serialization import dumps
+
+# Estados de un trabajo; los tres últimos son definitivos
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINAL_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+
+class LeaseLost(Exception):
+    """El trabajo ya no pertenece a este worker (se reencoló y lo tomó otro)"""
+
+
+class JobStore(ABC):
+    """
+    Persistencia de los trabajos en segundo plano y de sus resultados parciales
+
+    Interfaz que implementan los backends (SQLite local, o una tabla de Postgres
+    compartida entre instancias). Un trabajo es un dict con id, owner, status,
+    params, requested, produced, error, cancel_requested, lease y marcas de tiempo.
+
+    Cada ``claim`` entrega un ``lease`` nuevo; las escrituras del worker lo
+    incluyen y fallan con ``LeaseLost`` si el trabajo ya es de otro. Los
+    resultados se registran en dos pasos: ``stage_results`` antes de guardarlos
+    fuera (p. ej. en Supabase) y ``commit_results`` después, de modo que tras
+    una caída los lotes a medias se pueden conciliar en vez de repetirse.
+    """
+
+    @abstractmethod
+    async def create(self, owner: str, params: Dict[str, Any], requested: int) -> Dict[str, Any]:
+        """Encola un trabajo nuevo y lo devuelve"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Pasa a running el trabajo en cola más antiguo y lo devuelve con su lease (None si no hay)"""
+
+    @abstractmethod
+    async def stage_results(self, job_id: str, lease: str, rows: List[Dict[str, Any]]) -> int:
+        """Anota un lote antes de guardarlo fuera; devuelve su id"""
+
+    @abstractmethod
+    async def commit_results(self, job_id: str, lease: str, batch_id: int, rows: List[Dict[str, Any]]):
+        """Sustituye el lote anotado por sus filas guardadas y las añade a los resultados"""
+
+    @abstractmethod
+    async def pending_results(self, job_id: str) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        """Lotes anotados y no confirmados (id, filas), en orden"""
+
+    @abstractmethod
+    async def results(self, job_id: str, offset: int = 0) -> List[Dict[str, Any]]:
+        """Resultados del trabajo a partir de la posición ``offset``"""
+
+    @abstractmethod
+    async def heartbeat(self, job_id: str, lease: str) -> bool:
+        """Renueva el latido; False si el lease ya no es válido"""
+
+    @abstractmethod
+    async def finish(self, job_id: str, lease: str, status: str, error: Optional[str] = None):
+        ...
+
+    @abstractmethod
+    async def requeue(self, job_id: str, lease: str):
+        """Devuelve a la cola un trabajo interrumpido (p. ej. al apagar la instancia)"""
+
+    @abstractmethod
+    async def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Pide cancelar un trabajo: si estaba en cola se cancela directamente y si
+        está en curso se marca para que su worker lo detenga. Devuelve el trabajo.
+        """
+
+    @abstractmethod
+    async def requeue_stale(self, lease_seconds: float) -> int:
+        """Reencola los trabajos running sin latido desde hace ``lease_seconds``"""
+
+    @abstractmethod
+    async def prune(self, max_age_seconds: float) -> int:
+        """Borra los trabajos terminados hace más de ``max_age_seconds``"""
+
+    def close(self):
+        pass
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Cola de trabajos en un fichero SQLite local
+
+    Sobrevive a reinicios del proceso; para varias instancias hace falta un
+    backend compartido con la misma interfaz.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Fichero SQLite (por defecto JOB_STORE_PATH o ".cache/jobs.sqlite3")
+        """
+        path = path or os.getenv("JOB_STORE_PATH", ".cache/jobs.sqlite3")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, owner TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "requested INTEGER NOT NULL, produced INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0, lease TEXT, created_at REAL NOT NULL, "
+            "started_at REAL, updated_at REAL NOT NULL, finished_at REAL)"
+        )
+        # Ficheros creados antes de que existiera el lease
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "lease" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN lease TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            "job_id TEXT NOT NULL, position INTEGER NOT NULL, row TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, position))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_pending ("
+            "batch_id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, rows TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    async def create(self, owner: str, params: Dict[str, Any], requested: int) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._create, owner, params, requested)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._claim)
+
+    async def stage_results(self, job_id: str, lease: str, rows: List[Dict[str, Any]]) -> int:
+        return await asyncio.to_thread(self._stage_results, job_id, lease, rows)
+
+    async def commit_results(self, job_id: str, lease: str, batch_id: int, rows: List[Dict[str, Any]]):
+        await asyncio.to_thread(self._commit_results, job_id, lease, batch_id, rows)
+
+    async def pending_results(self, job_id: str) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        return await asyncio.to_thread(self._pending_results, job_id)
+
+    async def results(self, job_id: str, offset: int = 0) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._results, job_id, offset)
+
+    async def heartbeat(self, job_id: str, lease: str) -> bool:
+        changed = await asyncio.to_thread(
+            self._write,
+            "UPDATE jobs SET updated_at = ? WHERE id = ? AND lease = ? AND status = ?",
+            (time.time(), job_id, lease, RUNNING)
+        )
+        return changed > 0
+
+    async def finish(self, job_id: str, lease: str, status: str, error: Optional[str] = None):
+        now = time.time()
+        await asyncio.to_thread(
+            self._write,
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ?, lease = NULL "
+            "WHERE id = ? AND lease = ?",
+            (status, error, now, now, job_id, lease)
+        )
+
+    async def requeue(self, job_id: str, lease: str):
+        await asyncio.to_thread(
+            self._write,
+            "UPDATE jobs SET status = ?, updated_at = ?, lease = NULL WHERE id = ? AND lease = ? AND status = ?",
+            (QUEUED, time.time(), job_id, lease, RUNNING)
+        )
+
+    async def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._request_cancel, job_id)
+
+    async def requeue_stale(self, lease_seconds: float) -> int:
+        now = time.time()
+        return await asyncio.to_thread(
+            self._write,
+            "UPDATE jobs SET status = ?, updated_at = ?, lease = NULL WHERE status = ? AND updated_at < ?",
+            (QUEUED, now, RUNNING, now - lease_seconds)
+        )
+
+    async def prune(self, max_age_seconds: float) -> int:
+        return await asyncio.to_thread(self._prune, time.time() - max_age_seconds)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # 🔹 Operaciones síncronas (se ejecutan en hilos)
+
+    def _create(self, owner: str, params: Dict[str, Any], requested: int) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, owner, status, params, requested, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, owner, QUEUED, json.dumps(params, ensure_ascii=False), requested, now, now)
+            )
+            self._db.commit()
+        return self._get(job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            # Selección y cambio de estado en una sola sentencia: dos workers no toman el mismo
+            row = self._db.execute(
+                "UPDATE jobs SET status = ?, lease = ?, started_at = COALESCE(started_at, ?), updated_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+                "RETURNING *",
+                (RUNNING, uuid.uuid4().hex, now, now, QUEUED)
+            ).fetchone()
+            self._db.commit()
+        return self._to_job(row) if row else None
+
+    def _stage_results(self, job_id: str, lease: str, rows: List[Dict[str, Any]]) -> int:
+        with self._lock:
+            self._check_lease(job_id, lease)
+            batch_id = self._db.execute(
+                "INSERT INTO job_pending (job_id, rows) VALUES (?, ?)", (job_id, dumps(rows).decode())
+            ).lastrowid
+            self._db.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            self._db.commit()
+        return batch_id
+
+    def _commit_results(self, job_id: str, lease: str, batch_id: int, rows: List[Dict[str, Any]]):
+        with self._lock:
+            self._check_lease(job_id, lease)
+            produced = self._db.execute("SELECT produced FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            self._db.executemany(
+                "INSERT INTO job_results (job_id, position, row) VALUES (?, ?, ?)",
+                [
+                    (job_id, produced + i, dumps(row).decode())
+                    for i, row in enumerate(rows)
+                ]
+            )
+            # Resultados y fin del lote pendiente en la misma transacción
+            self._db.execute("DELETE FROM job_pending WHERE batch_id = ?", (batch_id,))
+            self._db.execute(
+                "UPDATE jobs SET produced = ?, updated_at = ? WHERE id = ?",
+                (produced + len(rows), time.time(), job_id)
+            )
+            self._db.commit()
+
+    def _pending_results(self, job_id: str) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT batch_id, rows FROM job_pending WHERE job_id = ? ORDER BY batch_id", (job_id,)
+            ).fetchall()
+        return [(row[0], orjson.loads(row[1])) for row in rows]
+
+    def _check_lease(self, job_id: str, lease: str):
+        # Se llama con el lock tomado
+        row = self._db.execute("SELECT lease FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] != lease:
+            raise LeaseLost(job_id)
+
+    def _results(self, job_id: str, offset: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT row FROM job_results WHERE job_id = ? AND position >= ? ORDER BY position",
+                (job_id, offset)
+            ).fetchall()
+        return [orjson.loads(row[0]) for row in rows]
+
+    def _request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, now, now, job_id, QUEUED)
+            )
+            self._db.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = ?",
+                (now, job_id, RUNNING)
+            )
+            self._db.commit()
+        return self._get(job_id)
+
+    def _prune(self, cutoff: float) -> int:
+        placeholders = ", ".join("?" for _ in FINAL_STATUSES)
+        with self._lock:
+            for table in ("job_results", "job_pending"):
+                self._db.execute(
+                    f"DELETE FROM {table} WHERE job_id IN "
+                    f"(SELECT id FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?)",
+                    (*FINAL_STATUSES, cutoff)
+                )
+            deleted = self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*FINAL_STATUSES, cutoff)
+            ).rowcount
+            self._db.commit()
+        return deleted
+
+    def _write(self, sql: str, params: tuple) -> int:
+        with self._lock:
+            changed = self._db.execute(sql, params).rowcount
+            self._db.commit()
+        return changed
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
@@ -0,0 +1,193 @@
+# utils/services/llm_scheduler.py
+import contextvars
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import openai
+
+from utils.services import tracing
+from utils.tools.concurrency import FairLimiter, TokenBucket
+from utils.tools.text_utils import count_tokens
+
+# Clave de la petición HTTP en curso; las tareas creadas dentro la heredan
+_request_key: contextvars.ContextVar[str] = contextvars.ContextVar("llm_request_key", default="default")
+
+
+class LLMScheduler:
+    """
+    Planificador global de ejecuciones de agentes (``Runner.run``)
+
+    Limita las llamadas en vuelo de todo el proceso, respeta presupuestos de
+    tokens y peticiones por minuto usando los tokens estimados del prompt,
+    reparte los huecos por turnos entre peticiones HTTP y, ante errores 429,
+    pausa los envíos con backoff exponencial y reduce la concurrencia (AIMD).
+    """
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        max_backoff_seconds: float = 60.0,
+        openai_client: Optional[openai.AsyncOpenAI] = None
+    ):
+        """
+        Args:
+            max_in_flight: Llamadas simultáneas (por defecto LLM_MAX_IN_FLIGHT o 32)
+            tokens_per_minute: Presupuesto TPM de entrada (por defecto LLM_TPM; 0 = sin límite)
+            requests_per_minute: Presupuesto RPM (por defecto LLM_RPM; 0 = sin límite)
+            max_backoff_seconds: Pausa máxima tras errores 429 consecutivos
+            openai_client: Cliente que usará el SDK de agentes (se registra en la primera llamada)
+        """
+        self.max_in_flight = max_in_flight or int(os.getenv("LLM_MAX_IN_FLIGHT", "32"))
+        tokens_per_minute = tokens_per_minute if tokens_per_minute is not None else int(os.getenv("LLM_TPM", "0"))
+        requests_per_minute = requests_per_minute if requests_per_minute is not None else int(os.getenv("LLM_RPM", "0"))
+        self.max_backoff_seconds = max_backoff_seconds
+        self.openai_client = openai_client
+        self._runner = None
+
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._limiter = FairLimiter(self.max_in_flight, admit=self._admit)
+
+        self._cooldown_until = 0.0
+        self._backoff = 0.0
+        self._successes_since_increase = 0
+        self.rate_limited = 0
+        self.completed = 0
+
+    @staticmethod
+    def new_request_key() -> str:
+        return uuid.uuid4().hex
+
+    @contextmanager
+    def request_scope(self, key: Optional[str] = None):
+        """Agrupa las llamadas hechas dentro del bloque bajo una misma clave de reparto"""
+        token = _request_key.set(key or self.new_request_key())
+        try:
+            yield
+        finally:
+            _request_key.reset(token)
+
+    async def scoped(self, key: str, awaitable):
+        """
+        Espera ``awaitable`` bajo la clave de reparto ``key``
+
+        Pensado para envolver la corrutina de una tarea nueva
+        (``asyncio.create_task(scheduler.scoped(key, coro))``), cuyo contexto es propio.
+        """
+        _request_key.set(key)
+        return await awaitable
+
+    async def run(self, agent, prompt: str, stage: str = "agent", **kwargs) -> Any:
+        """
+        Equivalente a ``Runner.run(agent, prompt)`` pasando por el planificador
+
+        ``stage`` da nombre al span de la llamada (p. ej. ``agent.generation``).
+        """
+        instructions = getattr(agent, "instructions", None)
+        cost = count_tokens(prompt) + (count_tokens(instructions) if isinstance(instructions, str) else 0)
+        with tracing.span(stage, input_tokens=cost) as current:
+            queued_at = time.monotonic()
+            key = _request_key.get()
+            await self._limiter.acquire(key, cost)
+            current.set(queue_seconds=round(time.monotonic() - queued_at, 3))
+            try:
+                result = await self._get_runner().run(agent, prompt, **kwargs)
+            except Exception as e:
+                if self._is_rate_limit(e):
+                    self._on_rate_limited(e)
+                raise
+            finally:
+                self._limiter.release(key)
+
+            # Tokens reales de la API si el SDK los reporta (la estimación queda si no)
+            usage = getattr(getattr(result, "context_wrapper", None), "usage", None)
+            if usage is not None and getattr(usage, "input_tokens", 0):
+                current.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens)
+
+        self._on_success()
+        return result
+
+    def _get_runner(self):
+        # El SDK de agentes (y MCP) tarda en importarse: se carga en la primera llamada
+        if self._runner is None:
+            from agents import Runner, set_default_openai_client
+
+            if self.openai_client is not None:
+                set_default_openai_client(self.openai_client)
+            self._runner = Runner
+        return self._runner
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self._limiter.in_flight,
+            "waiting": self._limiter.waiting,
+            "max_in_flight": self._limiter.max_in_flight,
+            "cooldown_seconds": max(0.0, self._cooldown_until - time.monotonic()),
+            "rate_limited": self.rate_limited,
+            "completed": self.completed,
+        }
+
+    def _admit(self, cost: int) -> float:
+        now = time.monotonic()
+        if now < self._cooldown_until:
+            return self._cooldown_until - now
+
+        wait = max(
+            self._tokens.wait_time(cost) if self._tokens else 0.0,
+            self._requests.wait_time(1) if self._requests else 0.0
+        )
+        if wait > 0:
+            return wait
+
+        if self._tokens:
+            self._tokens.consume(cost)
+        if self._requests:
+            self._requests.consume(1)
+        return 0.0
+
+    def _on_rate_limited(self, error: Exception):
+        self.rate_limited += 1
+        # Retroceso exponencial con jitter, o el Retry-After de OpenAI si viene
+        self._backoff = min(self.max_backoff_seconds, max(1.0, self._backoff * 2))
+        pause = self._retry_after(error) or self._backoff * random.uniform(0.5, 1.0)
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + pause)
+        # Disminución multiplicativa de la concurrencia
+        self._limiter.max_in_flight = max(1, self._limiter.max_in_flight // 2)
+        self._successes_since_increase = 0
+        print(f"⚠️ 429 de OpenAI: pausa de {pause:.1f}s, concurrencia reducida a {self._limiter.max_in_flight}")
+
+    def _on_success(self):
+        self.completed += 1
+        self._backoff /= 2
+        if self._limiter.max_in_flight < self.max_in_flight:
+            # Aumento aditivo: +1 por cada "ventana" completa sin 429
+            self._successes_since_increase += 1
+            if self._successes_since_increase >= self._limiter.max_in_flight:
+                self._successes_since_increase = 0
+                self._limiter.max_in_flight += 1
+
+    @staticmethod
+    def _is_rate_limit(error: Optional[BaseException]) -> bool:
+        # El SDK de agentes puede envolver el error de OpenAI
+        seen = set()
+        while error is not None and id(error) not in seen:
+            if isinstance(error, openai.RateLimitError) or getattr(error, "status_code", None) == 429:
+                return True
+            seen.add(id(error))
+            error = error.__cause__ or error.__context__
+        return False
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        value = response.headers.get("retry-after") if response is not None else None
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
@@ -0,0 +1,63 @@
+# utils/services/local_embedding_models.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+# (modelo, backend, fichero ONNX) -> modelo cargado, compartido por todo el proceso
+_models: Dict[Tuple[str, str, Optional[str]], object] = {}
+_models_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_sentence_transformer(model_name: str, backend: Optional[str] = None, onnx_file: Optional[str] = None):
+    """
+    Devuelve el SentenceTransformer de ``model_name``, cargándolo una sola vez por proceso
+
+    Args:
+        model_name: Modelo de Hugging Face o ruta local
+        backend: "torch" (por defecto SENTENCE_TRANSFORMERS_BACKEND o "torch"), "onnx" u "openvino"
+        onnx_file: Fichero ONNX dentro del modelo, p. ej. "onnx/model_qint8_avx2.onnx" para
+            la variante cuantizada int8 (por defecto SENTENCE_TRANSFORMERS_ONNX_FILE).
+            Requiere ``pip install "sentence-transformers[onnx]"``.
+    """
+    backend = backend or os.getenv("SENTENCE_TRANSFORMERS_BACKEND", "torch")
+    if backend != "torch" and onnx_file is None:
+        onnx_file = os.getenv("SENTENCE_TRANSFORMERS_ONNX_FILE") or None
+    key = (model_name, backend, onnx_file)
+
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            # Import diferido: torch y transformers solo se cargan si se usa este proveedor
+            from sentence_transformers import SentenceTransformer
+
+            model_kwargs = {"file_name": onnx_file} if onnx_file else None
+            print(f"⏳ Cargando modelo de embeddings local {model_name} (backend {backend})...")
+            model = SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs)
+            _models[key] = model
+    return model
+
+
+def get_encode_executor() -> ThreadPoolExecutor:
+    """
+    Pool acotado y exclusivo para codificar con modelos locales
+
+    Con EMBEDDING_ENCODE_WORKERS hilos (por defecto 1): torch/onnxruntime ya
+    paralelizan cada lote entre los núcleos, así que más hilos solo compiten por
+    la CPU, y el pool por defecto de asyncio queda libre para el resto de tareas.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("EMBEDDING_ENCODE_WORKERS", "1")),
+                    thread_name_prefix="embedding-encode"
+                )
+    return _executor
@@ -0,0 +1,204 @@
+# utils/services/local_vector_index.py
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.repository.async_supabase_repository import AsyncSupabaseRepository
+from utils.tools.quantization import PRECISIONS, QuantizedMatrix, truncate_dimensions
+from utils.tools.vector_utils import normalize_rows, top_k_similar
+
+
+class LocalVectorIndex:
+    """
+    Índice vectorial en memoria sobre la tabla ``law_items``
+
+    Guarda todos los embeddings en una matriz float32 contigua y normalizada,
+    de modo que el top-k es un único producto matriz-vector más ``argpartition``.
+
+    Con una precisión reducida (float16, int8 o binary) en memoria solo queda la
+    matriz cuantizada: la búsqueda preselecciona ``limit * rescore_multiplier``
+    candidatos con ella y los reordena en float32, leyendo los vectores completos
+    de un fichero mapeado en disco (o, sin fichero, de los descuantizados).
+    """
+
+    def __init__(
+        self,
+        supabase: Optional[AsyncSupabaseRepository] = None,
+        table_name: str = "law_items",
+        embedding_column: Optional[str] = None,
+        page_size: int = 1000,
+        precision: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        rescore_multiplier: Optional[int] = None,
+        rescore_path: Optional[str] = None
+    ):
+        """
+        Args:
+            supabase: Repositorio del esquema "law_frame"
+            table_name: Tabla con el contenido y los embeddings
+            embedding_column: Columna pgvector (por defecto LOCAL_INDEX_EMBEDDING_COLUMN o "embedding")
+            page_size: Filas por página al cargar (PostgREST limita cada respuesta)
+            precision: "float32", "float16", "int8" o "binary" (por defecto LOCAL_INDEX_PRECISION o "float32")
+            dimensions: Recorte Matryoshka de los vectores; las consultas más largas se
+                recortan igual (por defecto LOCAL_INDEX_DIMENSIONS o 0 = sin recorte)
+            rescore_multiplier: Candidatos por resultado que se reordenan en float32
+                (por defecto LOCAL_INDEX_RESCORE_MULTIPLIER o 4)
+            rescore_path: Fichero .npy con los vectores float32 para reordenar (por defecto
+                LOCAL_INDEX_RESCORE_PATH o ".cache/vector_index.float32.npy"). Una cadena
+                vacía reordena con los vectores descuantizados.
+        """
+        self.supabase = supabase or AsyncSupabaseRepository(schema="law_frame")
+        self.table_name = table_name
+        self.embedding_column = embedding_column or os.getenv("LOCAL_INDEX_EMBEDDING_COLUMN", "embedding")
+        self.page_size = page_size
+        self.precision = (precision or os.getenv("LOCAL_INDEX_PRECISION", "float32")).lower()
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"Precisión de índice no soportada: {self.precision}")
+        self.dimensions = dimensions or int(os.getenv("LOCAL_INDEX_DIMENSIONS", "0")) or None
+        self.rescore_multiplier = rescore_multiplier or int(os.getenv("LOCAL_INDEX_RESCORE_MULTIPLIER", "4"))
+        if rescore_path is None:
+            rescore_path = os.getenv("LOCAL_INDEX_RESCORE_PATH", ".cache/vector_index.float32.npy")
+        self.rescore_path = rescore_path
+
+        self.ids: List[Any] = []
+        self.documents: List[Dict[str, Any]] = []
+        # Vectores float32 (en memoria, o mapeados en disco si hay matriz cuantizada)
+        self.matrix: Optional[np.ndarray] = None
+        self.quantized: Optional[QuantizedMatrix] = None
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return (self.matrix is not None or self.quantized is not None) and len(self.ids) > 0
+
+    @property
+    def dimension(self) -> int:
+        if self.quantized is not None:
+            return self.quantized.shape[1]
+        return self.matrix.shape[1] if self.matrix is not None else 0
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes de vectores que ocupa el índice en RAM (sin contar el fichero mapeado)"""
+        if self.quantized is not None:
+            return self.quantized.nbytes
+        return self.matrix.nbytes if self.matrix is not None else 0
+
+    async def load(self):
+        """Descarga la tabla completa por páginas y construye la matriz normalizada"""
+        started = time.perf_counter()
+        ids: List[Any] = []
+        documents: List[Dict[str, Any]] = []
+        vectors: List[np.ndarray] = []
+
+        offset = 0
+        while True:
+            rows = await self.supabase.select(
+                self.table_name,
+                columns=f"id,content,{self.embedding_column}",
+                order_by="id",
+                limit=self.page_size,
+                offset=offset
+            )
+            for row in rows:
+                vector = self._parse_vector(row.get(self.embedding_column))
+                if vector is None or vector.size == 0:
+                    continue
+                ids.append(row.get("id"))
+                documents.append({"id": row.get("id"), "content": row.get("content", "")})
+                vectors.append(vector)
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+
+        if not vectors:
+            print(f"⚠️ Índice local vacío: no hay embeddings en {self.table_name}")
+            return
+
+        self.build(ids, documents, np.vstack(vectors))
+        print(
+            f"✅ Índice local cargado: {len(ids)} documentos, dimensión {self.dimension}, "
+            f"{self.precision}, {self.memory_bytes / 1e6:.1f} MB en {time.perf_counter() - started:.1f}s"
+        )
+
+    def build(self, ids: List[Any], documents: List[Dict[str, Any]], vectors: np.ndarray):
+        """Construye el índice a partir de vectores ya descargados (mismo orden que ``ids``)"""
+        matrix = normalize_rows(truncate_dimensions(vectors, self.dimensions), copy=False)
+
+        quantized = None
+        if self.precision != "float32":
+            quantized = QuantizedMatrix(matrix, self.precision)
+            matrix = self._map_full_precision(matrix) if self.rescore_path else None
+
+        # Se sustituye todo de una vez para que las búsquedas en curso no vean un estado a medias
+        self.ids, self.documents = ids, documents
+        self.matrix, self.quantized = matrix, quantized
+        self.loaded_at = time.time()
+
+    def search(self, embedding: List[float], limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Devuelve los ``limit`` documentos más similares (similitud coseno)
+
+        Args:
+            embedding: Vector de la consulta
+            limit: Número máximo de resultados
+        """
+        if not self.is_ready:
+            raise RuntimeError("El índice local no está cargado")
+
+        if self.dimensions and len(embedding) > self.dimension:
+            embedding = truncate_dimensions(embedding, self.dimension)[0]
+        if len(embedding) != self.dimension:
+            raise ValueError(f"Dimensión de consulta {len(embedding)} distinta de la del índice {self.dimension}")
+
+        if self.quantized is None:
+            indices, scores = top_k_similar(embedding, self.matrix, limit)
+        else:
+            indices, scores = self._search_quantized(normalize_rows(embedding)[0], limit)
+        return [
+            {**self.documents[i], "similarity": score}
+            for i, score in zip(indices.tolist(), scores.tolist())
+        ]
+
+    def _search_quantized(self, query: np.ndarray, limit: int):
+        # 1) preselección aproximada sobre la matriz cuantizada
+        quantized, matrix = self.quantized, self.matrix
+        n = quantized.shape[0]
+        limit = min(limit, n)
+        if limit <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates = min(n, limit * self.rescore_multiplier)
+        coarse = quantized.scores(query)
+        top = np.argpartition(-coarse, candidates - 1)[:candidates] if candidates < n else np.arange(n)
+        # Índices ordenados: lectura secuencial del fichero mapeado
+        top.sort()
+
+        # 2) reordenación en float32 solo de los candidatos
+        full = matrix[top] if matrix is not None else quantized.dequantize(top)
+        exact = full @ query
+        order = np.argsort(-exact)[:limit]
+        return top[order], exact[order]
+
+    def _map_full_precision(self, matrix: np.ndarray) -> np.ndarray:
+        """Vuelca los vectores float32 a disco y los devuelve mapeados (los lee el SO bajo demanda)"""
+        directory = os.path.dirname(self.rescore_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Fichero nuevo y rename: las búsquedas en curso conservan el mapeo anterior
+        temporary = f"{self.rescore_path}.tmp"
+        with open(temporary, "wb") as file:
+            np.save(file, matrix)
+        os.replace(temporary, self.rescore_path)
+        return np.load(self.rescore_path, mmap_mode="r")
+
+    @staticmethod
+    def _parse_vector(value) -> Optional[np.ndarray]:
+        # PostgREST devuelve pgvector como texto "[0.1,0.2,...]"
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return np.fromstring(value.strip("[]"), sep=",", dtype=np.float32)
+        return np.asarray(json.loads(value) if isinstance(value, bytes) else value, dtype=np.float32)
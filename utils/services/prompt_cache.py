@@ -0,0 +1,78 @@
+# utils/services/prompt_cache.py
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from utils.repository.async_supabase_repository import AsyncSupabaseRepository
+
+
+class PromptCache:
+    """
+    Caché de proceso con TTL para los prompts de sistema de la tabla ``gpt_prompts``
+
+    Cada prompt se guarda junto a una versión (hash de su contenido), que los
+    consumidores usan para memoizar los objetos construidos a partir de él.
+    """
+
+    def __init__(self, supabase: Optional[AsyncSupabaseRepository] = None, ttl_seconds: Optional[float] = None):
+        """
+        Args:
+            supabase: Repositorio asíncrono del esquema público
+            ttl_seconds: Segundos de validez de cada prompt
+                (por defecto PROMPT_CACHE_TTL o 300)
+        """
+        self.supabase = supabase or AsyncSupabaseRepository()
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("PROMPT_CACHE_TTL", "300"))
+        # destination -> (prompt, versión, instante de carga)
+        self._entries: Dict[str, Tuple[str, str, float]] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, destination: str) -> Tuple[str, str]:
+        """
+        Devuelve ``(prompt, versión)`` para un destino, recargándolo si ha caducado
+
+        Si la recarga falla y hay una copia anterior, se sigue sirviendo la copia.
+        """
+        entry = self._entries.get(destination)
+        if entry and time.monotonic() - entry[2] < self.ttl_seconds:
+            return entry[0], entry[1]
+
+        async with self._lock:
+            # Otra corrutina puede haberlo recargado mientras esperábamos
+            entry = self._entries.get(destination)
+            if entry and time.monotonic() - entry[2] < self.ttl_seconds:
+                return entry[0], entry[1]
+            try:
+                return await self._load(destination)
+            except Exception as e:
+                if entry:
+                    print(f"⚠️ No se pudo recargar el prompt '{destination}', usando copia en caché: {e}")
+                    return entry[0], entry[1]
+                raise
+
+    def invalidate(self, destination: Optional[str] = None):
+        """Descarta un prompt (o todos) para que se recargue en el próximo acceso"""
+        if destination is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(destination, None)
+
+    async def refresh(self, destinations: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """
+        Recarga inmediatamente los prompts indicados (por defecto, los ya cacheados)
+
+        Returns:
+            Diccionario {destino: versión}
+        """
+        async with self._lock:
+            targets = list(destinations) if destinations is not None else list(self._entries)
+            return {destination: (await self._load(destination))[1] for destination in targets}
+
+    async def _load(self, destination: str) -> Tuple[str, str]:
+        prompt_data = await self.supabase.select("gpt_prompts", {"destination": destination})
+        prompt = prompt_data[0].get("prompt_system", "") if prompt_data else ""
+        version = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+        self._entries[destination] = (prompt, version, time.monotonic())
+        return prompt, version
@@ -0,0 +1,89 @@
+# utils/services/retrieval_cache.py
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class RetrievalCache:
+    """
+    Caché con TTL de resultados de búsqueda RAG con deduplicación de peticiones en vuelo
+
+    Las entradas se guardan junto a la versión del corpus con la que se
+    calcularon; si la versión cambia, dejan de servirse. Varias búsquedas
+    idénticas simultáneas comparten una única carga (single-flight).
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        Args:
+            ttl_seconds: Validez de cada resultado (por defecto RETRIEVAL_CACHE_TTL o 600)
+            max_entries: Resultados máximos en memoria (por defecto RETRIEVAL_CACHE_ENTRIES o 1024)
+        """
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+        self.max_entries = max_entries or int(os.getenv("RETRIEVAL_CACHE_ENTRIES", "1024"))
+        # clave -> (versión del corpus, instante de carga, documentos)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[Hashable, Any], asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        corpus_version: Any,
+        loader: Callable[[], Awaitable[List[Dict[str, Any]]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Devuelve los documentos cacheados para ``key`` o los carga con ``loader``
+
+        Cada llamante recibe copias de los documentos, que puede modificar libremente.
+        Si la carga falla, el error llega a todos los que la esperaban y no se cachea nada.
+        """
+        entry = self._entries.get(key)
+        if entry and entry[0] == corpus_version and time.monotonic() - entry[1] < self.ttl_seconds:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(entry[2])
+
+        flight_key = (key, corpus_version)
+        task = self._inflight.get(flight_key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, corpus_version, loader))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+
+        # shield: si un llamante se cancela, la carga sigue para los demás
+        return self._copy(await asyncio.shield(task))
+
+    def invalidate(self):
+        """Descarta todos los resultados cacheados"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+        }
+
+    async def _load(self, key, corpus_version, loader) -> List[Dict[str, Any]]:
+        documents = await loader()
+        # Un resultado vacío suele venir de un error ya registrado: no se cachea
+        if documents:
+            self._entries[key] = (corpus_version, time.monotonic(), documents)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return documents
+
+    @staticmethod
+    def _copy(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [dict(doc) for doc in documents]
@@ -0,0 +1,130 @@
+# utils/services/tracing.py
+import contextvars
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from prometheus_client import Counter, Histogram
+
+# Cubos pensados para etapas que van de milisegundos (caché) a minutos (agentes)
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+STAGE_LATENCY = Histogram(
+    "llm_rag_stage_duration_seconds", "Duración de cada etapa del pipeline", ["stage"],
+    buckets=_LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter("llm_rag_stage_errors_total", "Etapas terminadas con error", ["stage"])
+STAGE_RETRIES = Counter("llm_rag_stage_retries_total", "Reintentos dentro de cada etapa", ["stage"])
+STAGE_TOKENS = Counter(
+    "llm_rag_stage_tokens_total", "Tokens consumidos por etapa", ["stage", "kind"]
+)
+REQUEST_LATENCY = Histogram(
+    "llm_rag_request_duration_seconds", "Duración de las peticiones HTTP", ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS
+)
+
+# Traza de la petición HTTP en curso y span abierto más interno
+_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    """Tramo medido de una etapa, con atributos libres (tokens, backend, filas...)"""
+
+    def __init__(self, stage: str, parent: Optional["Span"] = None, **attributes: Any):
+        self.stage = stage
+        self.parent = parent
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.retries = 0
+        self.error: Optional[str] = None
+        self.started_at = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def retry(self, attempt: int = 0, error: Optional[BaseException] = None):
+        """Anota un reintento; su firma encaja con ``retry_async(on_retry=...)``"""
+        self.retries += 1
+        STAGE_RETRIES.labels(self.stage).inc()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "parent": self.parent.stage if self.parent else None,
+            "duration_ms": round((self.duration or 0) * 1000, 1),
+            "retries": self.retries,
+            "error": self.error,
+            **self.attributes,
+        }
+
+
+class Trace:
+    """Spans terminados de una petición, identificados por su trace-id"""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self.started_at = time.perf_counter()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Por etapa: número de spans, tiempo total (s), reintentos y tokens"""
+        stages: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.stage, {"count": 0, "seconds": 0.0, "retries": 0, "tokens": 0})
+            stage["count"] += 1
+            stage["seconds"] += span.duration or 0
+            stage["retries"] += span.retries
+            stage["tokens"] += span.attributes.get("input_tokens", 0) + span.attributes.get("output_tokens", 0)
+        return stages
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def start_trace(trace_id: Optional[str] = None) -> Iterator[Trace]:
+    """Abre la traza de una petición; las tareas creadas dentro la heredan"""
+    trace = Trace(trace_id)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+@contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Mide una etapa y la registra en los histogramas y en la traza en curso
+
+    Los atributos ``input_tokens`` y ``output_tokens`` se suman además al
+    contador de tokens de la etapa.
+    """
+    current = Span(stage, parent=_span.get(), **attributes)
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        _span.reset(token)
+        current.duration = time.perf_counter() - current.started_at
+        STAGE_LATENCY.labels(stage).observe(current.duration)
+        for kind in ("input", "output"):
+            tokens = current.attributes.get(f"{kind}_tokens")
+            if tokens:
+                STAGE_TOKENS.labels(stage, kind).inc(tokens)
+
+        trace = _trace.get()
+        if trace is not None:
+            trace.spans.append(current)
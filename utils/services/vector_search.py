@@ -1,16 +1,76 @@
 # utils/rag/vector_search.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
-from utils.repository.supabase_repository import SupabaseRepository
+import os
+import time
+from utils.repository.async_supabase_repository import AsyncSupabaseRepository
+from utils.services import tracing
+from utils.services.local_vector_index import LocalVectorIndex
+from utils.tools.vector_utils import cosine_similarity, cosine_similarities
 
 class VectorSearchService:
     """
     Servicio para búsqueda vectorial pura usando Supabase con pgvector
+
+    Con el backend "local" las búsquedas se resuelven en memoria con
+    LocalVectorIndex; la RPC de Supabase se usa mientras el índice no está
+    cargado o si la búsqueda local falla.
     """
 
-    def __init__(self):
-        self.supabase = SupabaseRepository()
+    def __init__(
+        self,
+        supabase: Optional[AsyncSupabaseRepository] = None,
+        backend: Optional[str] = None,
+        local_index: Optional[LocalVectorIndex] = None
+    ):
+        """
+        Args:
+            supabase: Repositorio ya configurado con el esquema "law_frame".
+                Si no se indica, se crea uno nuevo.
+            backend: "rpc" o "local" (por defecto VECTOR_SEARCH_BACKEND o "rpc")
+            local_index: Índice en memoria para el backend "local"
+        """
+        self.supabase = supabase or AsyncSupabaseRepository(schema="law_frame")
         self.table_name = "law_items"  # Tabla de embeddings
+        self.backend = (backend or os.getenv("VECTOR_SEARCH_BACKEND", "rpc")).lower()
+
+        if self.backend not in ("rpc", "local"):
+            raise ValueError(f"Backend de búsqueda no soportado: {self.backend}")
+
+        self.local_index = local_index
+        if self.backend == "local" and self.local_index is None:
+            self.local_index = LocalVectorIndex(self.supabase, self.table_name)
+
+        # Versión del corpus (nº de filas de law_items), consultada como mucho cada CORPUS_VERSION_TTL s
+        self.corpus_version_ttl = float(os.getenv("CORPUS_VERSION_TTL", "60"))
+        self._corpus_version = None
+        self._corpus_version_at = 0.0
+
+    async def get_corpus_version(self):
+        """
+        Identificador que cambia cuando cambia el corpus de law_items
+
+        Con el índice local cargado es su instante de carga; si no, el número de
+        filas de la tabla. No detecta ediciones in situ: tras reingestar, invalidar
+        las cachés explícitamente.
+        """
+        if self.local_index is not None and self.local_index.is_ready:
+            return f"local:{self.local_index.loaded_at}"
+
+        if self._corpus_version is None or time.monotonic() - self._corpus_version_at >= self.corpus_version_ttl:
+            try:
+                self._corpus_version = f"count:{await self.supabase.count(self.table_name)}"
+            except Exception as e:
+                print(f"⚠️ No se pudo obtener la versión del corpus: {e}")
+                if self._corpus_version is None:
+                    self._corpus_version = "unknown"
+            self._corpus_version_at = time.monotonic()
+        return self._corpus_version
+
+    async def load_local_index(self):
+        """Carga (o recarga) el índice en memoria si el backend es 'local'"""
+        if self.local_index is not None:
+            await self.local_index.load()
 
     async def search_similar_vectors(
         self,
@@ -27,37 +87,50 @@ class VectorSearchService:
         Returns:
             Lista de documentos con su contenido y score de similitud
         """
-        try:
-            # Verificar que el embedding no esté vacío
-            if not embedding:
-                print("❌ Embedding vacío")
-                return []
+        # Verificar que el embedding no esté vacío
+        if not embedding:
+            print("❌ Embedding vacío")
+            return []
+
+        if self.local_index is not None and self.local_index.is_ready:
+            try:
+                with tracing.span("vector_search", backend="local"):
+                    return self.local_index.search(embedding, limit)
+            except Exception as e:
+                print(f"⚠️ Búsqueda local fallida, usando RPC: {e}")
 
+        with tracing.span("vector_search", backend="rpc") as current:
+            documents = await self._search_rpc(embedding, limit)
+            current.set(results=len(documents))
+            return documents
+
+    async def _search_rpc(self, embedding: List[float], limit: int) -> List[Dict[str, Any]]:
+        """Búsqueda mediante la función RPC law_frame.search_law_items"""
+        try:
             print(f"🔍 Buscando similitudes para embedding de dimensión: {len(embedding)}")
             
-            # Convertir embedding a formato PostgreSQL array
-            # Formato: [1.0,2.0,3.0] - sin espacios y con punto decimal
-            embedding_array = [float(x) for x in embedding]  # Asegurar que son floats
+            # Los embeddings ya son listas de float: se envían sin copiarlos
+            embedding_array = embedding.tolist() if hasattr(embedding, "tolist") else embedding
             
-            # Llamar a la función RPC en Supabase
-            result = self.supabase.client.schema("law_frame").rpc(
+            # Llamar a la función RPC en Supabase (esquema law_frame)
+            data = await self.supabase.rpc(
                 "search_law_items",
                 {
                     "p_query": embedding_array,  # Enviar como array de floats
                     "p_limit_count": limit
                 }
-            ).execute()
+            )
 
-            print(f"✅ Resultado de búsqueda recibido. Registros: {len(result.data) if result.data else 0}")
+            print(f"✅ Resultado de búsqueda recibido. Registros: {len(data) if data else 0}")
             
             # Debug: mostrar estructura del primer resultado
-            if result.data and len(result.data) > 0:
-                print(f"📋 Estructura del primer resultado: {list(result.data[0].keys())}")
-                # print(f"📋 Primer resultado: {result.data[0]}")
+            if data and len(data) > 0:
+                print(f"📋 Estructura del primer resultado: {list(data[0].keys())}")
+                # print(f"📋 Primer resultado: {data[0]}")
 
-            if result.data:
+            if data:
                 documents = []
-                for item in result.data:
+                for item in data:
                     # Adaptar a la estructura que retorna tu función SQL actual
                     doc = {
                         "id": item.get("id"),
@@ -105,21 +178,26 @@ class VectorSearchService:
             Score de similitud entre 0 y 1
         """
         try:
-            import numpy as np
-            
-            vec1 = np.array(query_embedding)
-            vec2 = np.array(doc_vector)
-            
-            # Similitud coseno
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-            
-            return dot_product / (norm1 * norm2)
-            
+            return cosine_similarity(query_embedding, doc_vector)
         except Exception as e:
             print(f"Error calculando similitud: {e}")
-            return 0.0
\ No newline at end of file
+            return 0.0
+
+    def rescore_documents(self, query_embedding: List[float], documents: List[Dict[str, Any]], doc_vectors) -> List[Dict[str, Any]]:
+        """
+        Recalcula la similitud de varios documentos en una sola operación vectorizada
+
+        Args:
+            query_embedding: Vector de la consulta
+            documents: Documentos a puntuar (se actualiza su clave "similarity")
+            doc_vectors: Matriz (n, d) con los vectores de los documentos, en el mismo orden
+
+        Returns:
+            Documentos ordenados por similitud descendente
+        """
+        if not documents:
+            return []
+        scores = cosine_similarities(query_embedding, doc_vectors)
+        for doc, score in zip(documents, scores):
+            doc["similarity"] = score
+        return sorted(documents, key=lambda doc: doc["similarity"], reverse=True)
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+
+class FairLimiter:
+    """
+    Límite de concurrencia con cola justa (round-robin) entre claves
+
+    Cada clave (petición, usuario...) tiene su propia cola FIFO y los huecos libres
+    se reparten por turnos entre las claves con espera, de modo que una clave con
+    muchas tareas no acapara el límite. Opcionalmente, ``admit(cost)`` decide si
+    la siguiente tarea puede entrar ya (devuelve 0) o cuántos segundos esperar,
+    y ``max_per_key`` limita las tareas en curso de cada clave.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        admit: Optional[Callable[[Any], float]] = None,
+        max_per_key: Optional[int] = None
+    ):
+        self._max_in_flight = max(1, max_in_flight)
+        self._admit = admit
+        self._max_per_key = max_per_key
+        self.in_flight = 0
+        self._in_flight_by_key: Dict[Hashable, int] = {}
+        self._queues: Dict[Hashable, Deque[Tuple[asyncio.Future, Any]]] = {}
+        self._order: Deque[Hashable] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def max_in_flight(self) -> int:
+        return self._max_in_flight
+
+    @max_in_flight.setter
+    def max_in_flight(self, value: int):
+        self._max_in_flight = max(1, value)
+        self._dispatch()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def waiting_for(self, key: Hashable) -> int:
+        return len(self._queues.get(key, ()))
+
+    def in_flight_for(self, key: Hashable) -> int:
+        return self._in_flight_by_key.get(key, 0)
+
+    def would_wait(self, key: Hashable = None) -> bool:
+        """Si un acquire de ``key`` tendría que esperar ahora (sin contar ``admit``)"""
+        return (
+            self.in_flight >= self._max_in_flight
+            or self._at_key_limit(key)
+            or key in self._queues
+        )
+
+    async def acquire(self, key: Hashable = None, cost: Any = None):
+        """Espera turno para ``key``; cada acquire debe ir seguido de un release"""
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._order.append(key)
+        queue.append((future, cost))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Si el hueco ya se había concedido, se devuelve
+            if future.done() and not future.cancelled():
+                self.release(key)
+            raise
+
+    def release(self, key: Hashable = None):
+        self.in_flight -= 1
+        remaining = self._in_flight_by_key.get(key, 0) - 1
+        if remaining > 0:
+            self._in_flight_by_key[key] = remaining
+        else:
+            self._in_flight_by_key.pop(key, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self._max_in_flight and self._order:
+            if not self._rotate_to_eligible():
+                return
+            key = self._order[0]
+            queue = self._queues[key]
+            future, cost = queue[0]
+
+            if future.done():
+                # Cancelado mientras esperaba
+                queue.popleft()
+                self._advance(key, queue)
+                continue
+
+            if self._admit is not None:
+                wait = self._admit(cost)
+                if wait > 0:
+                    self._schedule(wait)
+                    return
+
+            queue.popleft()
+            self._advance(key, queue)
+            self.in_flight += 1
+            self._in_flight_by_key[key] = self._in_flight_by_key.get(key, 0) + 1
+            future.set_result(None)
+
+    def _at_key_limit(self, key: Hashable) -> bool:
+        return self._max_per_key is not None and self._in_flight_by_key.get(key, 0) >= self._max_per_key
+
+    def _rotate_to_eligible(self) -> bool:
+        # Las claves en su límite propio ceden el turno; False si ninguna puede avanzar
+        for _ in range(len(self._order)):
+            key = self._order[0]
+            if not self._at_key_limit(key) or self._queues[key][0][0].done():
+                return True
+            self._order.rotate(-1)
+        return False
+
+    def _advance(self, key: Hashable, queue: Deque):
+        # La clave pasa al final del turno, o sale si ya no tiene espera
+        self._order.popleft()
+        if queue:
+            self._order.append(key)
+        else:
+            del self._queues[key]
+
+    def _schedule(self, wait: float):
+        if self._timer is not None:
+            return
+
+        def fire():
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later(wait, fire)
+
+
+class TokenBucket:
+    """Cubo de tokens que se rellena de forma continua a ``per_minute`` unidades por minuto"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    def wait_time(self, cost: float) -> float:
+        """Segundos hasta poder gastar ``cost`` (0 si ya se puede)"""
+        self._refill()
+        cost = min(cost, self.capacity)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def consume(self, cost: float):
+        self.tokens -= min(cost, self.capacity)
+
+    def refund(self, cost: float):
+        """Devuelve ``cost`` consumido por una operación que no llegó a hacerse"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + min(cost, self.capacity))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
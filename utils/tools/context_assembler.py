@@ -0,0 +1,123 @@
+import re
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence
+
+from utils.tools.text_utils import count_tokens, iter_chunks
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Un recorte por presupuesto que deje menos de esto no compensa enviarlo
+MIN_PARTIAL_TOKENS = 50
+
+
+def shingles(text: str, size: int = 5) -> FrozenSet[int]:
+    """Conjunto de n-gramas de palabras (hasheados) para comparar solapamiento entre textos"""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return frozenset([hash(tuple(words))]) if words else frozenset()
+    return frozenset(hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+def overlap(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    """
+    Coeficiente de solapamiento |A∩B| / min(|A|, |B|)
+
+    A diferencia de Jaccard, vale 1 cuando un pasaje está contenido en otro
+    (p. ej. un apartado y el artículo completo).
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def assemble_context(
+    documents: Sequence[Dict[str, Any]],
+    max_tokens: int,
+    dedup_threshold: float = 0.8,
+    mmr_lambda: Optional[float] = None,
+    token_counter: Optional[Callable[[str], int]] = None
+) -> List[str]:
+    """
+    Selecciona pasajes para el contexto de generación dentro de un presupuesto de tokens
+
+    Args:
+        documents: Resultados de búsqueda (``content`` y opcionalmente ``similarity``), por relevancia
+        max_tokens: Presupuesto total de tokens del contexto
+        dedup_threshold: Solapamiento a partir del cual un pasaje se descarta por duplicado
+        mmr_lambda: Si se indica (0-1), orden por MMR: relevancia frente a diversidad
+            respecto a lo ya elegido; None conserva el orden de relevancia
+        token_counter: Contador de tokens (por defecto, tiktoken)
+
+    Returns:
+        Un texto por documento (sin mezclar fuentes); el último puede ir recortado
+        por párrafos/oraciones para ajustarse al presupuesto
+    """
+    counter = token_counter or count_tokens
+    candidates = [doc for doc in documents if (doc.get("content") or "").strip()]
+    if not candidates:
+        return []
+
+    contents = [doc["content"].strip() for doc in candidates]
+    fingerprints = [shingles(content) for content in contents]
+    relevance = _relevance(candidates)
+
+    selected: List[int] = []
+    remaining = list(range(len(candidates)))
+    context: List[str] = []
+    used_tokens = 0
+    dropped = 0
+
+    while remaining and used_tokens < max_tokens:
+        best = _next_candidate(remaining, selected, relevance, fingerprints, mmr_lambda)
+        remaining.remove(best)
+
+        if any(overlap(fingerprints[best], fingerprints[i]) >= dedup_threshold for i in selected):
+            dropped += 1
+            continue
+
+        tokens = counter(contents[best])
+        budget = max_tokens - used_tokens
+        if tokens > budget:
+            if budget < MIN_PARTIAL_TOKENS:
+                break
+            # Recorte por límites naturales del texto, no a mitad de palabra
+            partial = next(iter_chunks(contents[best], budget, counter), "")
+            if partial:
+                selected.append(best)
+                context.append(partial)
+                used_tokens += counter(partial)
+            break
+
+        selected.append(best)
+        context.append(contents[best])
+        used_tokens += tokens
+
+    print(
+        f"🧩 Contexto: {len(context)}/{len(candidates)} documentos, {used_tokens}/{max_tokens} tokens"
+        + (f", {dropped} duplicados descartados" if dropped else "")
+    )
+    return context
+
+
+def _relevance(documents: Sequence[Dict[str, Any]]) -> List[float]:
+    # La RPC puede devolver la misma similitud para todos: entonces manda el rango
+    scores = [float(doc.get("similarity") or 0.0) for doc in documents]
+    if max(scores) - min(scores) > 1e-9:
+        return scores
+    return [1.0 - i / len(documents) for i in range(len(documents))]
+
+
+def _next_candidate(
+    remaining: List[int],
+    selected: List[int],
+    relevance: List[float],
+    fingerprints: List[FrozenSet[int]],
+    mmr_lambda: Optional[float]
+) -> int:
+    if mmr_lambda is None or not selected:
+        return max(remaining, key=lambda i: relevance[i])
+
+    def mmr(i: int) -> float:
+        redundancy = max(overlap(fingerprints[i], fingerprints[j]) for j in selected)
+        return mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy
+
+    return max(remaining, key=mmr)
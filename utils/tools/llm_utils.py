@@ -6,26 +6,19 @@ from datetime import datetime
 def extract_questions_from_response(response: list[Question], academy: int,
                                     topic: int, llm_model: str) -> List[Question]:
     try:
-        updated_questions = []
-        for q in response:
-            # Crear una copia con los valores actualizados
-            updated_q = Question(
-                id=q.id,
-                academy=q.academy if q.academy is not None else academy,
-                question=q.question,
-                answer1=q.answer1,
-                answer2=q.answer2,
-                answer3=q.answer3,
-                answer4=q.answer4,
-                solution=q.solution,
-                tip=q.tip,
-                topic=q.topic if q.topic is not None else topic,
-                createdAt=q.createdAt if q.createdAt is not None else datetime.now(),
-                order=q.order,
-                question_prompt=q.question_prompt,
-                llm_model=q.llm_model if q.llm_model is not None else llm_model
-            )
-            updated_questions.append(updated_q)
+        # Las preguntas acaban de validarse al parsear la salida del agente y no se
+        # comparten: se completan en sitio en vez de reconstruirlas con pydantic
+        now = datetime.now()
+        updated_questions = list(response)
+        for q in updated_questions:
+            if q.academy is None:
+                q.academy = academy
+            if q.topic is None:
+                q.topic = topic
+            if q.createdAt is None:
+                q.createdAt = now
+            if q.llm_model is None:
+                q.llm_model = llm_model
         
         return updated_questions
     except Exception as e:
@@ -37,5 +30,6 @@ def merge_feedback_into_questions(questions: List[Question], feedbacks: list[str
         
         retro_text = feedbacks[i] if i < len(feedbacks) else ""
         # print(f"Feedback for question {i}: {feedbacks[i]}")
-        questions[i] = question.copy_with(tip=retro_text)
+        # En sitio: las preguntas son del lote en curso, no hace falta copiarlas
+        question.tip = retro_text
     return questions
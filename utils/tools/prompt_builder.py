@@ -0,0 +1,64 @@
+from typing import Iterable, List, NamedTuple, Optional
+
+from utils.models.question_model import Question
+from utils.tools.text_utils import count_tokens
+
+# Longitud del extracto del texto fuente que se guarda en question_prompt
+SOURCE_EXCERPT_CHARS = 200
+
+
+class QuestionPrompt(NamedTuple):
+    """Prompt de generación de un lote junto a su texto fuente y su tamaño en tokens"""
+    text: str
+    source: str
+    num_questions: int
+    tokens: int
+
+
+def build_question_prompt(
+    base_prompt: str, num_questions: int, has4questions: bool, chunk: Optional[str] = None
+) -> QuestionPrompt:
+    """
+    Prompt de generación sin esquema JSON de ejemplo
+
+    El agente de preguntas ya declara ``output_type=list[Question]`` (salida
+    estructurada); academy, topic, llm_model y question_prompt los rellena el
+    servidor, así que el prompt solo lleva la tarea y el texto fuente.
+    """
+    num_answers = 4 if has4questions else 3
+    rules = f"Cada pregunta tiene {num_answers} opciones; solution es el número (1-{num_answers}) de la correcta."
+    if not has4questions:
+        rules += " answer4 es null."
+
+    if chunk:
+        text = f'{base_prompt}\nGenera {num_questions} preguntas tipo test basadas en este texto. {rules}\n"""\n{chunk}\n"""'
+    else:
+        text = f"{base_prompt}\nGenera {num_questions} preguntas tipo test basadas únicamente en el tema. {rules}"
+    return QuestionPrompt(text, chunk or base_prompt, num_questions, count_tokens(text))
+
+
+def build_feedback_prompt(questions: List[Question], academy: int, topic: int) -> str:
+    """
+    Prompt de feedback con solo lo que el revisor necesita: enunciado, opciones y solución
+
+    Sin ids, fechas ni metadatos y en texto numerado, que ocupa bastantes menos
+    tokens que el JSON indentado del modelo completo.
+    """
+    lines = [
+        f"Analiza estas {len(questions)} preguntas (topic {topic}, academia {academy}) "
+        f"y devuelve una explicación por pregunta, en el mismo orden:"
+    ]
+    for i, question in enumerate(questions, 1):
+        answers = [question.answer1, question.answer2, question.answer3, question.answer4]
+        options = " | ".join(f"{n}) {answer}" for n, answer in enumerate(answers, 1) if answer)
+        lines.append(f"{i}. {question.question}\n{options}\nCorrecta: {question.solution}")
+    return "\n".join(lines)
+
+
+def source_excerpt(source: str) -> str:
+    """Extracto del texto fuente tal y como se guarda en Question.question_prompt"""
+    return f"{source[:SOURCE_EXCERPT_CHARS]}..."
+
+
+def total_tokens(prompts: Iterable[QuestionPrompt]) -> int:
+    return sum(prompt.tokens for prompt in prompts)
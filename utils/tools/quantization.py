@@ -0,0 +1,110 @@
+from typing import Optional
+
+import numpy as np
+
+from utils.tools.vector_utils import MatrixLike, as_float32_matrix, normalize_rows
+
+# Precisiones admitidas, de más a menos memoria (4, 2, 1 y 1/8 bytes por dimensión)
+PRECISIONS = ("float32", "float16", "int8", "binary")
+
+
+def truncate_dimensions(matrix: MatrixLike, dimensions: Optional[int]) -> np.ndarray:
+    """
+    Recorta embeddings Matryoshka a sus primeras ``dimensions`` componentes y renormaliza
+
+    Equivale a pedir ``dimensions`` a la API de OpenAI (modelos text-embedding-3),
+    así que vectores ya guardados a tamaño completo sirven para consultas recortadas.
+    """
+    matrix = as_float32_matrix(matrix)
+    if not dimensions or dimensions >= matrix.shape[1]:
+        return matrix
+    return normalize_rows(matrix[:, :dimensions])
+
+
+class QuantizedMatrix:
+    """
+    Embeddings normalizados guardados en precisión reducida
+
+    - float16: mitad de memoria, pérdida despreciable.
+    - int8: cuantización escalar por dimensión (rango calibrado con el propio corpus), 4×.
+    - binary: un bit por dimensión (signo), 32×; la puntuación es por distancia de Hamming.
+
+    ``scores`` da una similitud aproximada pensada para preseleccionar candidatos
+    que después se reordenan en float32. En CPU, float16 ahorra memoria pero no
+    tiempo: numpy convierte cada bloque a float32 antes de multiplicar.
+    """
+
+    def __init__(self, matrix: MatrixLike, precision: str = "int8", chunk_size: Optional[int] = None):
+        """
+        Args:
+            matrix: Matriz (n, d) de embeddings ya normalizados
+            precision: "float32", "float16", "int8" o "binary"
+            chunk_size: Filas por bloque al puntuar (por defecto ~4 MB en float32, que caben en caché)
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Precisión no soportada: {precision}")
+        matrix = as_float32_matrix(matrix)
+        self.precision = precision
+        self.chunk_size = chunk_size or max(256, (1 << 20) // max(1, matrix.shape[1]))
+        self.shape = matrix.shape
+        self._offset: Optional[np.ndarray] = None
+        self._scale: Optional[np.ndarray] = None
+
+        if precision == "float32":
+            self.data = matrix
+        elif precision == "float16":
+            self.data = matrix.astype(np.float16)
+        elif precision == "int8":
+            # x ≈ offset + scale * (q + 128), con q en [-128, 127]
+            low, high = matrix.min(axis=0), matrix.max(axis=0)
+            self._offset = low
+            self._scale = np.maximum(high - low, 1e-12) / 255.0
+            quantized = np.rint((matrix - low) / self._scale) - 128
+            self.data = np.clip(quantized, -128, 127).astype(np.int8)
+        else:
+            self.data = np.packbits(matrix > 0, axis=1)
+
+    @property
+    def nbytes(self) -> int:
+        extra = sum(array.nbytes for array in (self._offset, self._scale) if array is not None)
+        return self.data.nbytes + extra
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Similitud aproximada (n,) de una consulta float32 normalizada contra todas las filas"""
+        if self.precision == "float32":
+            return self.data @ query
+        if self.precision == "binary":
+            return self._binary_scores(query)
+
+        if self.precision == "int8":
+            # Sin descuantizar: q·x = (q·scale)·(codes + 128) + q·offset
+            weights = query * self._scale
+            bias = float(query @ self._offset) + 128.0 * float(weights.sum())
+        else:
+            weights, bias = query, 0.0
+
+        result = np.empty(self.shape[0], dtype=np.float32)
+        for start in range(0, self.shape[0], self.chunk_size):
+            block = self.data[start:start + self.chunk_size].astype(np.float32)
+            result[start:start + block.shape[0]] = block @ weights + bias
+        return result
+
+    def dequantize(self, indices: np.ndarray) -> np.ndarray:
+        """Filas ``indices`` aproximadas en float32"""
+        rows = self.data[indices]
+        if self.precision == "int8":
+            return self._offset + self._scale * (rows.astype(np.float32) + 128.0)
+        if self.precision == "binary":
+            signs = np.unpackbits(rows, axis=1, count=self.shape[1]).astype(np.float32) * 2 - 1
+            return signs / np.sqrt(self.shape[1])
+        return rows.astype(np.float32)
+
+    def _binary_scores(self, query: np.ndarray) -> np.ndarray:
+        # Coseno aproximado por coincidencia de signos: 1 - 2·hamming/d
+        bits = np.packbits(query > 0)
+        result = np.empty(self.shape[0], dtype=np.float32)
+        for start in range(0, self.shape[0], self.chunk_size):
+            block = self.data[start:start + self.chunk_size]
+            hamming = np.bitwise_count(np.bitwise_xor(block, bits)).sum(axis=1, dtype=np.int32)
+            result[start:start + block.shape[0]] = 1.0 - 2.0 * hamming / self.shape[1]
+        return result
@@ -0,0 +1,53 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 30.0) -> float:
+    """Retroceso exponencial con jitter completo para el intento ``attempt`` (empezando en 1)"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+async def retry_async(
+    fn: Callable[[], Awaitable[T]],
+    max_attempts: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    deadline: Optional[float] = None,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    label: str = "Operación",
+    on_retry: Optional[Callable[[int, BaseException], None]] = None
+) -> T:
+    """
+    Ejecuta ``fn()`` reintentando los errores ``retry_on`` con backoff exponencial y jitter
+
+    Args:
+        fn: Función sin argumentos que devuelve la corrutina a ejecutar en cada intento
+        max_attempts: Intentos totales, incluido el primero
+        base_delay: Espera máxima tras el primer fallo; se duplica en cada intento
+        max_delay: Tope de la espera entre intentos
+        deadline: Instante (``time.monotonic()``) a partir del cual no se reintenta más
+        label: Nombre para los logs
+        on_retry: Se llama con (intento fallido, error) antes de cada reintento
+
+    Raises:
+        El último error si se agotan los intentos o el plazo
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await fn()
+        except retry_on as e:
+            if attempt >= max(1, max_attempts):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            if on_retry is not None:
+                on_retry(attempt, e)
+            print(f"🔁 {label} falló (intento {attempt}/{max_attempts}): {e}. Reintento en {delay:.1f}s")
+            await asyncio.sleep(delay)
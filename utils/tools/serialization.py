@@ -0,0 +1,14 @@
+from typing import Any
+
+import orjson
+
+
+def dumps(value: Any) -> bytes:
+    """JSON en bytes con orjson (datetimes en ISO 8601 y arrays de numpy sin convertir a listas)"""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def ndjson_line(value: Any) -> bytes:
+    """Una línea NDJSON"""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+
@@ -1,4 +1,102 @@
-from typing import List
+import os
+import re
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+_PARAGRAPH_BOUNDARY = re.compile(r"\s*\n\s*")
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+")
+
+# Espera máxima entre reintentos de carga del tokenizador
+ENCODING_RETRY_MAX_SECONDS = float(os.getenv("ENCODING_RETRY_MAX_SECONDS", "300"))
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failures = 0
+_encoding_retry_at = 0.0
+
+
+def load_encoding():
+    """
+    Carga el tokenizador de OpenAI (o200k_base, el de gpt-4o/gpt-5); None si no se puede
+
+    La primera carga descarga el vocabulario (E/S bloqueante) salvo que ya esté en
+    TIKTOKEN_CACHE_DIR, así que conviene llamarla al arrancar y fuera del event loop.
+    Un fallo no se guarda: se reintenta con espera exponencial y, mientras tanto,
+    los tokens se estiman. Si otro hilo está cargándolo, no espera y devuelve None.
+    """
+    global _encoding, _encoding_failures, _encoding_retry_at
+    if _encoding is not None:
+        return _encoding
+    if time.monotonic() < _encoding_retry_at or not _encoding_lock.acquire(blocking=False):
+        return None
+    try:
+        if _encoding is None:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+            _encoding_failures = 0
+        return _encoding
+    except Exception as e:
+        _encoding_failures += 1
+        delay = min(ENCODING_RETRY_MAX_SECONDS, 2.0 ** _encoding_failures)
+        _encoding_retry_at = time.monotonic() + delay
+        print(f"⚠️ tiktoken no disponible, se estimarán tokens (1 token ≈ 4 caracteres) y se reintentará en {delay:.0f}s: {e}")
+        return None
+    finally:
+        _encoding_lock.release()
+
+
+def count_tokens(text: str) -> int:
+    """Cuenta tokens con el tokenizador real; si no hay, estima 1 token ≈ 4 caracteres"""
+    if not text:
+        return 0
+    encoding = load_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def iter_chunks(
+    text: str,
+    max_tokens: int = 500,
+    token_counter: Optional[Callable[[str], int]] = None
+) -> Iterator[str]:
+    """
+    Divide un texto en chunks de hasta max_tokens tokens, en tiempo lineal.
+
+    Agrupa párrafos completos mientras caben; un párrafo demasiado largo se
+    divide por oraciones, una oración demasiado larga por palabras y una palabra
+    que no cabe sola, por caracteres. Cada fragmento se tokeniza una sola vez.
+    """
+    counter = token_counter or count_tokens
+    parts: List[str] = []
+    parts_tokens = 0
+
+    for piece, piece_tokens, new_paragraph in _iter_pieces(text, max_tokens, counter):
+        if parts and parts_tokens + piece_tokens > max_tokens:
+            yield "".join(parts)
+            parts, parts_tokens = [], 0
+        if parts:
+            parts.append("\n" if new_paragraph else " ")
+        parts.append(piece)
+        parts_tokens += piece_tokens
+
+    if parts:
+        yield "".join(parts)
+
+
+def chunk_documents(
+    documents: Iterable[str],
+    max_tokens: int = 500,
+    token_counter: Optional[Callable[[str], int]] = None
+) -> Iterator[str]:
+    """
+    Chunkea cada documento por separado, de modo que ningún chunk mezcla
+    fuentes distintas (p. ej. artículos distintos de law_items).
+    """
+    for document in documents:
+        if document and document.strip():
+            yield from iter_chunks(document, max_tokens, token_counter)
 
 
 def smart_chunk_text(text: str, max_words: int = 1000) -> List[str]:
@@ -6,51 +104,65 @@ def smart_chunk_text(text: str, max_words: int = 1000) -> List[str]:
     Divide un texto en chunks de hasta max_words palabras.
     Trata de respetar párrafos y oraciones para mantener la coherencia.
     """
+    return list(iter_chunks(text, max_words, token_counter=lambda piece: len(piece.split())))
+
+
+def _iter_pieces(text: str, max_tokens: int, counter: Callable[[str], int]) -> Iterator[Tuple[str, int, bool]]:
+    """Genera (fragmento, tokens, empieza_párrafo) con fragmentos de como mucho max_tokens"""
+    for paragraph in _PARAGRAPH_BOUNDARY.split(text.strip()):
+        if not paragraph:
+            continue
+        paragraph_tokens = counter(paragraph)
+        if paragraph_tokens <= max_tokens:
+            yield paragraph, paragraph_tokens, True
+            continue
+
+        new_paragraph = True
+        for sentence in _SENTENCE_BOUNDARY.split(paragraph):
+            sentence_tokens = counter(sentence)
+            if sentence_tokens <= max_tokens:
+                yield sentence, sentence_tokens, new_paragraph
+            else:
+                for words, words_tokens in _split_words(sentence, max_tokens, counter):
+                    yield words, words_tokens, new_paragraph
+                    new_paragraph = False
+            new_paragraph = False
+
+
+def _split_words(sentence: str, max_tokens: int, counter: Callable[[str], int]) -> Iterator[Tuple[str, int]]:
+    words: List[str] = []
+    words_tokens = 0
+    for word in sentence.split():
+        word_tokens = counter(" " + word)
+        if word_tokens > max_tokens:
+            # Una "palabra" que no cabe sola (URL, tabla sin espacios...) se parte por caracteres
+            if words:
+                yield " ".join(words), words_tokens
+            *pieces, (word, word_tokens) = _split_characters(word, word_tokens, max_tokens, counter)
+            yield from pieces
+            words, words_tokens = [word], word_tokens
+            continue
+        if words and words_tokens + word_tokens > max_tokens:
+            yield " ".join(words), words_tokens
+            words, words_tokens = [], 0
+        words.append(word)
+        words_tokens += word_tokens
+    if words:
+        yield " ".join(words), words_tokens
+
 
-    print(text)
-    # 1. Separar en párrafos
-    # paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
-    
-    # chunks = []
-    # current_chunk = []
-    # current_words = 0
-
-    # for paragraph in paragraphs:
-    #     # Contar palabras del párrafo
-    #     paragraph_words = len(paragraph.split())
-
-    #     # Si agregar el párrafo supera el límite, cerrar el chunk actual
-    #     if current_words + paragraph_words > max_words:
-    #         if current_chunk:
-    #             chunks.append(" ".join(current_chunk))
-    #         # Si el párrafo es demasiado grande, dividirlo por oraciones
-    #         if paragraph_words > max_words:
-    #             sentences = re.split(r'(?<=[.!?]) +', paragraph)
-    #             temp_chunk = []
-    #             temp_words = 0
-    #             for sentence in sentences:
-    #                 sentence_words = len(sentence.split())
-    #                 if temp_words + sentence_words > max_words:
-    #                     if temp_chunk:
-    #                         chunks.append(" ".join(temp_chunk))
-    #                     temp_chunk = [sentence]
-    #                     temp_words = sentence_words
-    #                 else:
-    #                     temp_chunk.append(sentence)
-    #                     temp_words += sentence_words
-    #             if temp_chunk:
-    #                 chunks.append(" ".join(temp_chunk))
-    #             current_chunk = []
-    #             current_words = 0
-    #         else:
-    #             current_chunk = [paragraph]
-    #             current_words = paragraph_words
-    #     else:
-    #         current_chunk.append(paragraph)
-    #         current_words += paragraph_words
-
-    # # Agregar el último chunk
-    # if current_chunk:
-    #     chunks.append(" ".join(current_chunk))
-
-    # return chunks
\ No newline at end of file
+def _split_characters(word: str, word_tokens: int, max_tokens: int, counter: Callable[[str], int]) -> List[Tuple[str, int]]:
+    """Trozos consecutivos de ``word`` de como mucho max_tokens tokens cada uno"""
+    # Tamaño inicial según los caracteres por token de la propia palabra; se reduce si no cabe
+    size = max(1, len(word) * max_tokens // word_tokens)
+    pieces = []
+    start = 0
+    while start < len(word):
+        piece = word[start:start + size]
+        piece_tokens = counter(piece)
+        while piece_tokens > max_tokens and len(piece) > 1:
+            piece = piece[:max(1, len(piece) * max_tokens // piece_tokens - 1)]
+            piece_tokens = counter(piece)
+        pieces.append((piece, piece_tokens))
+        start += len(piece)
+    return pieces
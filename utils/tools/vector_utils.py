@@ -0,0 +1,101 @@
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+VectorLike = Union[Sequence[float], np.ndarray]
+MatrixLike = Union[Sequence[Sequence[float]], np.ndarray]
+
+
+def as_float32_matrix(vectors: MatrixLike) -> np.ndarray:
+    """Convierte uno o varios vectores en una matriz 2D float32 contigua (sin copiar si ya lo es)"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    return np.ascontiguousarray(matrix)
+
+
+def normalize_rows(matrix: MatrixLike, copy: bool = True) -> np.ndarray:
+    """
+    Normaliza cada fila a norma 1. Las filas nulas se dejan a cero.
+
+    Con ``copy=False`` y una matriz float32 de entrada, se normaliza en sitio.
+    """
+    matrix = as_float32_matrix(matrix)
+    if copy:
+        matrix = matrix.copy()
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k_similar(
+    queries: MatrixLike,
+    candidates: MatrixLike,
+    k: int,
+    candidates_normalized: bool = True,
+    chunk_size: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k por similitud coseno de una o varias consultas contra una matriz de candidatos
+
+    Args:
+        queries: Un vector (d,) o una matriz (q, d)
+        candidates: Matriz (n, d); idealmente float32 ya normalizada
+        k: Número de resultados por consulta
+        candidates_normalized: Si es False, los candidatos se normalizan en una copia
+        chunk_size: Filas de candidatos por bloque para acotar la memoria (q, chunk_size)
+
+    Returns:
+        ``(indices, scores)`` ordenados de mayor a menor similitud, con forma (k,)
+        para una consulta 1D o (q, k) para una matriz de consultas
+    """
+    single = np.ndim(queries) == 1
+    query_matrix = normalize_rows(queries)
+    candidate_matrix = as_float32_matrix(candidates)
+    if not candidates_normalized:
+        candidate_matrix = normalize_rows(candidate_matrix)
+
+    n = candidate_matrix.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        shape = (0,) if single else (query_matrix.shape[0], 0)
+        return np.empty(shape, dtype=np.int64), np.empty(shape, dtype=np.float32)
+
+    chunk_size = chunk_size or n
+    best_indices: Optional[np.ndarray] = None
+    best_scores: Optional[np.ndarray] = None
+    for start in range(0, n, chunk_size):
+        # Un único GEMM por bloque: (q, d) x (d, c)
+        scores = query_matrix @ candidate_matrix[start:start + chunk_size].T
+        indices = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+        if best_scores is not None:
+            scores = np.concatenate([best_scores, scores], axis=1)
+            indices = np.concatenate([best_indices, indices], axis=1)
+        keep = min(k, scores.shape[1])
+        part = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        best_scores = np.take_along_axis(scores, part, axis=1)
+        best_indices = np.take_along_axis(indices, part, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_indices = np.take_along_axis(best_indices, order, axis=1)
+
+    if single:
+        return best_indices[0], best_scores[0]
+    return best_indices, best_scores
+
+
+def cosine_similarity(vector1: VectorLike, vector2: VectorLike) -> float:
+    """Similitud coseno entre dos vectores (0.0 si alguno es nulo)"""
+    pair = normalize_rows(np.vstack([np.asarray(vector1, dtype=np.float32), np.asarray(vector2, dtype=np.float32)]), copy=False)
+    return float(pair[0] @ pair[1])
+
+
+def cosine_similarities(query: VectorLike, candidates: MatrixLike, candidates_normalized: bool = False) -> List[float]:
+    """Similitud coseno de una consulta contra todos los candidatos, en su orden original"""
+    query_vector = normalize_rows(query)[0]
+    candidate_matrix = as_float32_matrix(candidates)
+    if not candidates_normalized:
+        candidate_matrix = normalize_rows(candidate_matrix)
+    return (candidate_matrix @ query_vector).tolist()